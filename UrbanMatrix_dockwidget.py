@@ -2,14 +2,16 @@ import os
 from qgis.PyQt.QtWidgets import (
     QDockWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QLineEdit, QPushButton, QComboBox, QWidget, QMessageBox,
-    QDesktopWidget,QFileDialog,
+    QDesktopWidget,QFileDialog, QCheckBox,
 )
 from qgis.PyQt.QtCore import pyqtSignal
 from qgis.core import QgsProject, QgsRasterLayer, QgsVectorLayer
 from .utils.grid_tools import create_grid_from_raster
-from .utils.data_ingestion import download_ms_buildings_from_extent
-from .utils.classification import calculate_coverage
-from .utils.matrix_calculation import assign_matrix_scores
+from .utils.data_ingestion import download_buildings, plan_buildings
+from .utils.sources import LocalFileSource, get_source, register_source, source_names
+from .utils.classification import calculate_coverage, calculate_coverage_pyramid
+from .utils.incremental import IncrementalCoverage
+from .utils.coverage_cache import clear_coverage_cache
 from .utils.styling import style_by_density_class, style_buildings_footprint
 
 
@@ -19,6 +21,9 @@ class UrbanMatrixDockWidget(QDockWidget):
     def __init__(self, parent=None):
         QgsProject.instance().layerWasAdded.connect(self.refresh_layer_dropdowns)
         super().__init__(parent)
+        # Result layer id -> IncrementalCoverage keeping it in sync with edits
+        self.incremental_updates = {}
+        QgsProject.instance().layersWillBeRemoved.connect(self.detach_incremental_updates)
         self.setFloating(True)
         #self.resize(400, 300)  # Optional: set initial size
         screen = QDesktopWidget().screenGeometry()
@@ -52,6 +57,16 @@ class UrbanMatrixDockWidget(QDockWidget):
         self.layout.addWidget(self.size_label)
         self.layout.addWidget(self.cellSizeInput)
 
+        # --- Virtual grid: only outline + spec, cells are built with the results ---
+        self.virtualGridCheck = QCheckBox("Virtual grid (for very fine grids)")
+        self.layout.addWidget(self.virtualGridCheck)
+        # --- Skip cells over nodata areas of the raster ---
+        self.validOnlyCheck = QCheckBox("Only cells over valid raster data")
+        self.layout.addWidget(self.validOnlyCheck)
+        # --- Hexagonal cells (same area as the square cells) ---
+        self.hexGridCheck = QCheckBox("Hexagonal cells")
+        self.layout.addWidget(self.hexGridCheck)
+
         # --- Generate Button ---
         self.generateGridBtn = QPushButton("Generate Grid")
         self.layout.addWidget(self.generateGridBtn)
@@ -65,13 +80,16 @@ class UrbanMatrixDockWidget(QDockWidget):
         # --- External Layer Download Section ---
         self.downloadLabel = QLabel("Download external data:")
         self.externalSourceCombo = QComboBox()
-        self.externalSourceCombo.addItems(["Microsoft Buildings"])  # Add more later
+        self.externalSourceCombo.addItems(source_names())
+        self.addSourceBtn = QPushButton("Add Local Building Dataset")
         self.downloadBtn = QPushButton("Download")
 
         self.layout.addWidget(self.downloadLabel)
         self.layout.addWidget(self.externalSourceCombo)
+        self.layout.addWidget(self.addSourceBtn)
         self.layout.addWidget(self.downloadBtn)
 
+        self.addSourceBtn.clicked.connect(self.add_local_source)
         self.downloadBtn.clicked.connect(self.download_selected_layer)
 
         # --- Applicaitons: Classification Section ---
@@ -102,10 +120,60 @@ class UrbanMatrixDockWidget(QDockWidget):
         self.layout.addWidget(self.lowThreshInput)
         self.layout.addWidget(self.midThreshInput)
         self.layout.addWidget(self.highThreshInput)
+        ### coverage method: exact polygon clipping or fast raster approximation
+        self.methodLabel = QLabel("Coverage method:")
+        self.coverageMethodCombo = QComboBox()
+        self.coverageMethodCombo.addItem("Exact", "auto")
+        self.coverageMethodCombo.addItem("Fast approximate", "raster")
+        self.resolutionInput = QLineEdit()
+        self.resolutionInput.setPlaceholderText("Approximate resolution in map units (default: 1)")
+        self.resolutionInput.setText("1")
+        self.resolutionInput.setEnabled(False)
+        self.coverageMethodCombo.currentIndexChanged.connect(
+            lambda _: self.resolutionInput.setEnabled(self.coverageMethodCombo.currentData() == "raster"))
+        self.layout.addWidget(self.methodLabel)
+        self.layout.addWidget(self.coverageMethodCombo)
+        self.layout.addWidget(self.resolutionInput)
+        ### optional memory budget: process large grids in spatial blocks
+        self.memoryBudgetInput = QLineEdit()
+        self.memoryBudgetInput.setPlaceholderText("Memory budget in MB (empty: no limit)")
+        self.layout.addWidget(self.memoryBudgetInput)
+        ### extra per-cell metrics computed in the same pass as coverage
+        self.metricsLabel = QLabel("Extra metrics (exact method only):")
+        self.metricChecks = {
+            "building_count": QCheckBox("Count"),
+            "mean_footprint": QCheckBox("Mean size"),
+            "max_footprint": QCheckBox("Largest"),
+            "perimeter_density": QCheckBox("Perimeter density"),
+        }
+        metrics_row = QHBoxLayout()
+        for check in self.metricChecks.values():
+            metrics_row.addWidget(check)
+        self.layout.addWidget(self.metricsLabel)
+        self.layout.addLayout(metrics_row)
+        ### worker processes for the exact coverage methods
+        self.workersInput = QLineEdit()
+        self.workersInput.setPlaceholderText("Worker processes (default: 1)")
+        self.workersInput.setText("1")
+        self.layout.addWidget(self.workersInput)
         ## Connect button action
         self.layout.addWidget(self.runClassificationBtn)
         self.runClassificationBtn.clicked.connect(self.classify_grid_coverage)
 
+        # --- Multi-resolution pyramid: one exact pass, coarser levels by block sums ---
+        self.pyramidFactorsInput = QLineEdit()
+        self.pyramidFactorsInput.setPlaceholderText("Pyramid cell size factors, e.g. 1,2,4,10")
+        self.pyramidFactorsInput.setText("1,2,4,10")
+        self.runPyramidBtn = QPushButton("Run multi-resolution classification")
+        self.layout.addWidget(self.pyramidFactorsInput)
+        self.layout.addWidget(self.runPyramidBtn)
+        self.runPyramidBtn.clicked.connect(self.classify_grid_pyramid)
+
+        # --- Coverage cache ---
+        self.clearCacheBtn = QPushButton("Clear coverage cache")
+        self.layout.addWidget(self.clearCacheBtn)
+        self.clearCacheBtn.clicked.connect(self.clear_cache)
+
 
     def closeEvent(self, event):
         self.closingPlugin.emit()
@@ -129,6 +197,17 @@ class UrbanMatrixDockWidget(QDockWidget):
                     self.classifyLayerCombo.addItem(layer.name(), layer.id())
 
 
+    def detach_incremental_updates(self, layer_ids):
+        """Stop incremental updates involving layers that are being removed."""
+        for result_id, updater in list(self.incremental_updates.items()):
+            if result_id in layer_ids or updater.feature_layer.id() in layer_ids:
+                updater.disconnect()
+                del self.incremental_updates[result_id]
+
+    def clear_cache(self):
+        clear_coverage_cache()
+        self.show_message("Coverage cache cleared.")
+
     def show_message(self, message):
         QMessageBox.information(self, "UrbanMatrix", message)
 
@@ -152,7 +231,10 @@ class UrbanMatrixDockWidget(QDockWidget):
             return
 
         try:
-            create_grid_from_raster(raster_layer, cell_size, "UrbanMatrix_Grid")
+            create_grid_from_raster(raster_layer, cell_size, "UrbanMatrix_Grid",
+                                    virtual=self.virtualGridCheck.isChecked(),
+                                    valid_only=self.validOnlyCheck.isChecked(),
+                                    hexagonal=self.hexGridCheck.isChecked())
             self.show_message("Grid created successfully.")
         except Exception as e:
             self.show_message(f"Error: {e}")
@@ -183,8 +265,19 @@ class UrbanMatrixDockWidget(QDockWidget):
             self.rasterCombo.setCurrentIndex(index)
         self.show_message(f"Raster '{layer_name}' loaded successfully.")
 
+    def add_local_source(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Building Dataset", "",
+            "Building datasets (*.parquet *.geoparquet *.fgb *.gpkg);;All files (*)")
+        if not file_path:
+            return
+        source = register_source(LocalFileSource(file_path))
+        if self.externalSourceCombo.findText(source.name) < 0:
+            self.externalSourceCombo.addItem(source.name)
+        self.externalSourceCombo.setCurrentText(source.name)
+
     def download_selected_layer(self):
-        source = self.externalSourceCombo.currentText()
+        source = get_source(self.externalSourceCombo.currentText())
         # Try to get the grid layer by name
         grid_layer = QgsProject.instance().mapLayersByName("UrbanMatrix_Grid")
         if not grid_layer:
@@ -196,14 +289,58 @@ class UrbanMatrixDockWidget(QDockWidget):
         extent = (extent_.xMinimum(), extent_.yMinimum(), extent_.xMaximum(), extent_.yMaximum())
         crs = grid_layer.crs().authid()
 
-        if source == "Microsoft Buildings":
-            layer = download_ms_buildings_from_extent(extent, crs)
-            if layer:
+        plan = plan_buildings(source, extent, crs)
+        if not plan:
+            self.show_message(f"No {source.name} data covers this area.")
+            return
+        layer = download_buildings(source, extent, crs, plan=plan)
+        if layer:
+            QgsProject.instance().addMapLayer(layer)
+            style_buildings_footprint(layer)
+            self.show_message(f"{source.name} downloaded.")
+        else:
+            self.show_message("Download failed.")
+
+    def read_thresholds(self):
+        """Returns the (low, mid, high) thresholds, or None after telling the user what is wrong."""
+        try:
+            low = float(self.lowThreshInput.text())
+            mid = float(self.midThreshInput.text())
+            high = float(self.highThreshInput.text())
+        except ValueError:
+            self.show_message("Please enter valid numeric thresholds.")
+            return None
+        #Validate Threshold Logic
+        if not (0 <= low < mid < high <= 100):
+            self.show_message("Thresholds must be in increasing order between 0 and 100.")
+            return None
+        return low, mid, high
+
+    def classify_grid_pyramid(self):
+        grid_layer = QgsProject.instance().mapLayer(self.gridLayerCombo.currentData() or "")
+        feature_layer = QgsProject.instance().mapLayer(self.classifyLayerCombo.currentData() or "")
+        if not grid_layer or not feature_layer:
+            self.show_message("Please select both grid and feature layers.")
+            return
+
+        try:
+            factors = [int(value) for value in self.pyramidFactorsInput.text().split(",") if value.strip()]
+        except ValueError:
+            self.show_message("Pyramid factors must be whole numbers separated by commas.")
+            return
+        thresholds = self.read_thresholds()
+        if thresholds is None:
+            return
+
+        try:
+            levels = calculate_coverage_pyramid(grid_layer, feature_layer, factors, thresholds=thresholds)
+            for _, layer in levels:
                 QgsProject.instance().addMapLayer(layer)
-                style_buildings_footprint(layer)
-                self.show_message("Microsoft buildings downloaded.")
-            else:
-                self.show_message("Download failed.")
+                style_by_density_class(layer)
+            self.show_message(f"Classified {len(levels)} resolutions: "
+                              f"{', '.join(f'{size:g}' for size, _ in levels)}.")
+        except Exception as e:
+            self.show_message(f"Classification failed: {e}")
 
     def classify_grid_coverage(self):
         grid_id = self.gridLayerCombo.currentData()
@@ -220,22 +357,45 @@ class UrbanMatrixDockWidget(QDockWidget):
             self.show_message("Invalid layers selected.")
             return
 
+        method = self.coverageMethodCombo.currentData()
+        try:
+            resolution = float(self.resolutionInput.text())
+        except ValueError:
+            self.show_message("Approximate resolution must be a number.")
+            return
+
+        budget_str = self.memoryBudgetInput.text().strip()
+        try:
+            memory_budget = float(budget_str) if budget_str else None
+        except ValueError:
+            self.show_message("Memory budget must be a number.")
+            return
+
+        try:
+            workers = int(self.workersInput.text() or 1)
+        except ValueError:
+            self.show_message("Worker processes must be a whole number.")
+            return
+        metrics = [name for name, check in self.metricChecks.items() if check.isChecked()]
+        if method == "raster":
+            workers = 1
+            metrics = []
+
+        # Get threshold values
+        thresholds = self.read_thresholds()
+        if thresholds is None:
+            return
+
         try:
-            updated_grid = calculate_coverage(grid_layer, feature_layer)
-            # Get threshold values
-            try:
-                low = float(self.lowThreshInput.text())
-                mid = float(self.midThreshInput.text())
-                high = float(self.highThreshInput.text())
-            except ValueError:
-                self.show_message("Please enter valid numeric thresholds.")
-                return
-            #Validate Threshold Logic
-            if not (0 <= low < mid < high <= 100):
-                self.show_message("Thresholds must be in increasing order between 0 and 100.")
-                return
-            assign_matrix_scores(updated_grid, low, mid, high)
+            updated_grid = calculate_coverage(grid_layer, feature_layer, method=method, resolution=resolution,
+                                              memory_budget_mb=memory_budget, workers=workers, metrics=metrics,
+                                              thresholds=thresholds)
             QgsProject.instance().addMapLayer(updated_grid)
             style_by_density_class(updated_grid)
+            self.incremental_updates[updated_grid.id()] = IncrementalCoverage(updated_grid, feature_layer)
+            if method == "raster":
+                error = updated_grid.customProperty("urbanmatrix/coverage_error_pct")
+                self.show_message(f"Approximate coverage done. Per-cell error bound: up to {float(error):.2f}% "
+                                  f"(see field 'coverage_pct_err').")
         except Exception as e:
             self.show_message(f"Classification failed: {e}")
@@ -0,0 +1,253 @@
+"""
+Ingestion throughput benchmark against a local mock tile server.
+
+Serves a synthetic dataset-links.csv and gzipped JSONL quadkey tiles from a
+local HTTP server, points the Microsoft building download at it through
+URBANMATRIX_MS_INDEX_URL and reports tiles/s, buildings/s, peak RSS and
+time-to-layer for small, city-sized and region-sized AOIs. Every scenario
+runs in a fresh process, first with an empty cache (cold) and then with the
+tile store filled by the first run (warm).
+
+Run from the plugin directory, preferably with the QGIS Python so the whole
+path down to the output layer is measured:
+
+    python -m benchmarks.ingest_benchmark
+    python -m benchmarks.ingest_benchmark --scenarios city --buildings-per-tile 200000
+
+Without QGIS the same pipeline runs up to the clipped buildings, without
+writing the GeoPackage.
+"""
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mercantile
+import numpy as np
+from pyproj import Transformer
+
+# AOI side length in metres per scenario
+SCENARIOS = {"small": 1000, "city": 20000, "region": 150000}
+
+# AOI centre (lon, lat) and the CRS the AOI is given in
+CENTER = (8.40, 49.01)
+AOI_CRS = "EPSG:32632"
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def aoi_extent(side):
+    x, y = Transformer.from_crs("EPSG:4326", AOI_CRS, always_xy=True).transform(*CENTER)
+    return (x - side / 2, y - side / 2, x + side / 2, y + side / 2)
+
+
+class MockTileServer:
+    """
+    Local stand-in for the Microsoft building footprint hosting.
+
+    Covers every zoom-9 quadkey of the largest scenario with `partitions`
+    files each. Tiles are generated up front (see generate_all) or on first
+    request, and kept in memory.
+    """
+
+    def __init__(self, buildings_per_tile, partitions=2, seed=0):
+        self.buildings_per_tile = buildings_per_tile
+        self.partitions = partitions
+        self.seed = seed
+        self.tiles = {}
+        self.lock = threading.Lock()
+
+        extent = aoi_extent(max(SCENARIOS.values()))
+        to_wgs84 = Transformer.from_crs(AOI_CRS, "EPSG:4326", always_xy=True)
+        west, south, east, north = to_wgs84.transform_bounds(*extent)
+        self.quadkeys = sorted(mercantile.quadkey(tile) for tile in mercantile.tiles(west, south, east, north, 9))
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/dataset-links.csv":
+                    body = server.index(f"http://127.0.0.1:{self.server.server_port}")
+                else:
+                    quadkey, part = self.path.rsplit("/", 1)[-1].split(".")[0].split("-")
+                    body = server.tile(quadkey, int(part))
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def index_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/dataset-links.csv"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def index(self, base):
+        # Roughly 60 bytes per gzipped building
+        size_kb = self.buildings_per_tile // self.partitions * 60 // 1024
+        rows = ["Location,QuadKey,Url,Size,UploadDate"]
+        rows += [f"Mock,{quadkey},{base}/tiles/{quadkey}-{part}.csv.gz,{size_kb}KB,2024-01-01"
+                 for quadkey in self.quadkeys for part in range(self.partitions)]
+        return "\n".join(rows).encode("utf-8")
+
+    def tile(self, quadkey, part):
+        with self.lock:
+            if (quadkey, part) not in self.tiles:
+                self.tiles[(quadkey, part)] = self._generate(quadkey, part)
+            return self.tiles[(quadkey, part)]
+
+    def generate_all(self):
+        """
+        Builds every tile before measuring, so generation does not count as download time.
+        """
+        for quadkey in self.quadkeys:
+            for part in range(self.partitions):
+                self.tile(quadkey, part)
+
+    def _generate(self, quadkey, part):
+        west, south, east, north = mercantile.bounds(mercantile.quadkey_to_tile(quadkey))
+        rng = np.random.default_rng([self.seed, int(quadkey, 4), part])
+        n = self.buildings_per_tile // self.partitions
+        x = rng.uniform(west, east, n)
+        y = rng.uniform(south, north, n)
+        size = rng.uniform(5e-5, 2e-4, n)
+        lines = []
+        for x0, y0, d in zip(x.tolist(), y.tolist(), size.tolist()):
+            x1, y1 = x0 + d, y0 + d * 0.7
+            lines.append(
+                '{"type":"Feature","properties":{"height":-1.0,"confidence":-1.0},'
+                f'"geometry":{{"type":"Polygon","coordinates":[[[{x0:.7f},{y0:.7f}],[{x1:.7f},{y0:.7f}],'
+                f'[{x1:.7f},{y1:.7f}],[{x0:.7f},{y1:.7f}],[{x0:.7f},{y0:.7f}]]]}}}}')
+        return gzip.compress("\n".join(lines).encode("utf-8"), compresslevel=6)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None if unavailable).
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(side, workers, use_qgis):
+    """
+    Runs one download in this process and returns its measurements.
+    """
+    from shapely.geometry import box
+    from utils.ms_index import extent_to_wgs84
+    from utils.sources import MicrosoftBuildings
+
+    extent = aoi_extent(side)
+    if use_qgis:
+        from qgis.core import QgsApplication
+        app = QgsApplication([], False)
+        app.initQgis()
+        from utils.data_ingestion import download_buildings
+
+    start = time.perf_counter()
+    source = MicrosoftBuildings()
+    aoi = extent_to_wgs84(extent, AOI_CRS)
+    plan = source.plan(aoi)
+    if use_qgis:
+        layer = download_buildings(source, extent, AOI_CRS, workers, plan=plan)
+        buildings = layer.featureCount() if layer is not None else 0
+    else:
+        from utils.reprojection import clip_to_aoi
+        buildings = 0
+        for _, gdf, error in source.batches(plan, aoi, workers):
+            if error is None:
+                buildings += len(clip_to_aoi(gdf, AOI_CRS, aoi, box(*extent)))
+    elapsed = time.perf_counter() - start
+
+    return {"tiles": len(plan), "buildings": buildings, "seconds": elapsed,
+            "tiles_per_s": len(plan) / elapsed, "buildings_per_s": buildings / elapsed,
+            "peak_rss_mb": peak_rss_mb(), "mode": "layer" if use_qgis else "buildings"}
+
+
+def _has_qgis():
+    try:
+        import qgis.core  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ingest_benchmark", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--buildings-per-tile", type=int, default=50000)
+    parser.add_argument("--partitions", type=int, default=2, help="files per quadkey")
+    parser.add_argument("--workers", type=int, default=4, help="parallel downloads")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    parser.add_argument("--child", metavar="SCENARIO", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        result = run_scenario(SCENARIOS[args.child], args.workers, _has_qgis())
+        print("RESULT " + json.dumps(result))
+        return 0
+
+    server = MockTileServer(args.buildings_per_tile, args.partitions)
+    print(f"Generating {len(server.quadkeys) * args.partitions} mock tiles...")
+    server.generate_all()
+    server.start()
+    results = []
+    try:
+        for name in args.scenarios:
+            # Removed with its tiles once both runs are done
+            with tempfile.TemporaryDirectory(prefix="urbanmatrix_bench_") as cache_dir:
+                env = dict(os.environ, URBANMATRIX_MS_INDEX_URL=server.index_url, URBANMATRIX_CACHE_DIR=cache_dir)
+                for cache in ("cold", "warm"):
+                    command = [sys.executable, "-m", "benchmarks.ingest_benchmark", "--child", name,
+                               "--workers", str(args.workers)]
+                    output = subprocess.run(command, cwd=PLUGIN_DIR, env=env, capture_output=True, text=True)
+                    lines = [line for line in output.stdout.splitlines() if line.startswith("RESULT ")]
+                    if output.returncode != 0 or not lines:
+                        print(output.stdout[-2000:], output.stderr[-2000:], sep="\n")
+                        raise RuntimeError(f"Scenario {name} ({cache}) failed")
+                    result = dict(json.loads(lines[-1][len("RESULT "):]), scenario=name, cache=cache)
+                    results.append(result)
+    finally:
+        server.stop()
+
+    print(f"{'scenario':<9}{'cache':<6}{'tiles':>6}{'buildings':>11}{'time (s)':>10}"
+          f"{'tiles/s':>9}{'bldg/s':>10}{'peak RSS (MB)':>15}")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+        print(f"{r['scenario']:<9}{r['cache']:<6}{r['tiles']:>6}{r['buildings']:>11}{r['seconds']:>10.2f}"
+              f"{r['tiles_per_s']:>9.2f}{r['buildings_per_s']:>10.0f}{rss:>15}")
+    print(f"Time measured to the {'output layer' if results and results[0]['mode'] == 'layer' else 'clipped buildings (no QGIS)'}.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
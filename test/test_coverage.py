@@ -0,0 +1,182 @@
+# coding=utf-8
+"""Coverage engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import importlib.util
+import multiprocessing.spawn
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.coverage import (
+    METRICS, building_area, building_area_raster, building_area_regular, building_area_strtree, coverage_metrics,
+    grid_metrics, strtree_metrics, worker_pool
+)
+from utils.hex_grid import HexGrid
+from utils.regular_grid import RegularGrid
+
+
+def make_grid(cols=4, rows=3, size=10.0):
+    """Square cells in the same column-major order as qgis:creategrid."""
+    return np.array([
+        shapely.box(c * size, (rows - r - 1) * size, (c + 1) * size, (rows - r) * size)
+        for c in range(cols) for r in range(rows)
+    ])
+
+
+def make_buildings(count=200, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-2, 40, count)
+    y = rng.uniform(-2, 30, count)
+    w = rng.uniform(0.5, 6, count)
+    h = rng.uniform(0.5, 6, count)
+    boxes = shapely.box(x, y, x + w, y + h)
+    # A few rotated, non-rectangular footprints
+    boxes[::7] = shapely.buffer(boxes[::7], 0.5, quad_segs=2)
+    return boxes
+
+
+def overlay_areas(cells, buildings):
+    grid = gpd.GeoDataFrame({"grid_id": np.arange(len(cells))}, geometry=cells)
+    features = gpd.GeoDataFrame(geometry=buildings)
+    clipped = gpd.overlay(features, grid, how="intersection")
+    sums = clipped.geometry.area.groupby(clipped["grid_id"]).sum()
+    return sums.reindex(grid["grid_id"], fill_value=0).to_numpy()
+
+
+class CoverageTest(unittest.TestCase):
+    """Test the coverage backends against gpd.overlay."""
+
+    def test_strtree_matches_overlay(self):
+        cells = make_grid()
+        buildings = make_buildings()
+        np.testing.assert_allclose(
+            building_area_strtree(cells, buildings), overlay_areas(cells, buildings))
+
+    def test_regular_matches_overlay(self):
+        cells = make_grid()
+        buildings = make_buildings()
+        np.testing.assert_allclose(
+            building_area_regular(cells, buildings), overlay_areas(cells, buildings))
+
+    def test_detect_regular_grid(self):
+        grid, row_idx, col_idx = RegularGrid.detect(make_grid(cols=4, rows=3))
+        self.assertEqual((grid.rows, grid.cols), (3, 4))
+        self.assertEqual((row_idx[1], col_idx[1]), (1, 0))
+        self.assertIsNone(RegularGrid.detect(shapely.buffer(make_grid(), 1.0)))
+
+    def test_implicit_grid_matches_cells(self):
+        grid = RegularGrid.from_extent(0, 0, 40, 30, 10)
+        cells = grid.cell_polygons(np.arange(grid.n_cells))
+        buildings = make_buildings()
+        expected = coverage_metrics(cells, buildings, "regular", METRICS)
+        results = grid_metrics(grid, buildings, METRICS)
+        for name in expected:
+            np.testing.assert_allclose(results[name], expected[name], err_msg=name)
+
+    def test_hex_grid_matches_strtree(self):
+        grid = HexGrid.from_extent(0, 0, 40, 30, 10)
+        cells = grid.cell_polygons(np.arange(grid.n_cells))
+        buildings = make_buildings()
+        expected = strtree_metrics(cells, buildings, METRICS)
+        results = grid_metrics(grid, buildings, METRICS)
+        for name in expected:
+            np.testing.assert_allclose(results[name], expected[name], err_msg=name)
+
+    def test_pyramid_level_matches_coarse_grid(self):
+        grid = RegularGrid.from_extent(0, 0, 40, 40, 5)
+        buildings = make_buildings()
+        fine = grid_metrics(grid, buildings)["building_area"]
+        np.testing.assert_allclose(grid.block_sum(fine, 4), grid_metrics(grid.coarsen(4), buildings)["building_area"])
+
+    def test_pyramid_edge_cells_are_clipped(self):
+        # 10 x 6 cells, so factor 4 leaves partial blocks on the last row and column
+        grid = RegularGrid.from_extent(0, 0, 50, 30, 5)
+        buildings = make_buildings()
+        fine = grid_metrics(grid, buildings)["building_area"]
+        coarse = grid.coarsen(4)
+        clipped = shapely.intersection(coarse.cell_polygons(np.arange(coarse.n_cells)), shapely.box(0, 0, 50, 30))
+        expected = strtree_metrics(clipped, buildings)["building_area"]
+        np.testing.assert_allclose(grid.block_area(4), shapely.area(clipped))
+        np.testing.assert_allclose(grid.block_sum(fine, 4), expected)
+        np.testing.assert_allclose(grid.block_sum(fine, 4) / grid.block_area(4), expected / shapely.area(clipped))
+
+    def test_parallel_matches_serial(self):
+        cells = make_grid(cols=12, rows=9, size=4.0)
+        buildings = make_buildings(500)
+        executable = multiprocessing.spawn.get_executable()
+        for method in ("strtree", "regular"):
+            np.testing.assert_array_equal(
+                building_area(cells, buildings, method, workers=2),
+                building_area(cells, buildings, method))
+        # The spawn interpreter is process-wide and must be left as it was
+        self.assertEqual(multiprocessing.spawn.get_executable(), executable)
+
+    def test_shared_worker_pool(self):
+        cells = make_grid(cols=12, rows=9, size=4.0)
+        with worker_pool(2) as pool:
+            for seed in (0, 1):
+                buildings = make_buildings(300, seed)
+                np.testing.assert_array_equal(
+                    coverage_metrics(cells, buildings, "regular", METRICS, workers=2, pool=pool)["building_area"],
+                    building_area(cells, buildings, "regular"))
+
+    def test_metrics_match_brute_force(self):
+        cells = make_grid()
+        # Random footprints plus ones lying along cell edges
+        edge_aligned = shapely.box(*np.array([
+            (0, 0, 10, 10), (10, 10, 20, 15), (5, 20, 15, 30), (30, 0, 40, 30), (20, 5, 30, 10), (12, 0, 18, 10)]).T)
+        buildings = np.concatenate([make_buildings(), edge_aligned])
+        outlines = shapely.boundary(buildings)
+        for method in ("strtree", "regular"):
+            results = coverage_metrics(cells, buildings, method, METRICS)
+            for i, cell in enumerate(cells):
+                clipped = shapely.intersection(buildings, cell)
+                overlapping = shapely.area(clipped) > 0
+                footprints = shapely.area(buildings[overlapping])
+                # Segments on the cell edges only count on its left and top edge
+                minx, miny, maxx, maxy = cell.bounds
+                owned_edges = shapely.LineString([(minx, miny), (minx, maxy), (maxx, maxy)])
+                outline = (shapely.length(shapely.intersection(outlines, cell))
+                           - shapely.length(shapely.intersection(outlines, cell.boundary))
+                           + shapely.length(shapely.intersection(outlines, owned_edges))).sum()
+                self.assertEqual(results["building_count"][i], overlapping.sum())
+                self.assertAlmostEqual(results["mean_footprint"][i], footprints.mean() if len(footprints) else 0)
+                self.assertAlmostEqual(results["max_footprint"][i], footprints.max(initial=0))
+                self.assertAlmostEqual(results["perimeter_density"][i], outline / cell.area)
+
+    @unittest.skipIf(importlib.util.find_spec("osgeo") is None, "GDAL is not installed")
+    def test_raster_error_bound(self):
+        cells = make_grid()
+        # Footprints smaller than a pixel and ones across the band seams
+        tiny = [shapely.box(x, y, x + 0.3, y + 0.3) for x, y in ((1.1, 1.1), (14.6, 24.2), (31.7, 8.9))]
+        buildings = np.concatenate([make_buildings(), tiny, [shapely.box(2, 8, 38, 12)]])
+        # One grid row per band, so every row boundary is a band seam
+        areas, bounds = building_area_raster(cells, buildings, resolution=3.0, max_pixels=4 * 3 * 3)
+        exact = shapely.area(shapely.intersection(shapely.union_all(buildings), cells))
+        self.assertTrue(np.all(np.abs(areas - exact) <= bounds + 1e-9))
+        # Cells holding a footprint smaller than a pixel are never certain
+        self.assertTrue(np.all(bounds[shapely.intersects(cells[:, None], tiny).any(axis=1)] > 0))
+
+    def test_no_buildings(self):
+        cells = make_grid()
+        np.testing.assert_array_equal(
+            building_area_strtree(cells, np.array([], dtype=object)), np.zeros(len(cells)))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CoverageTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
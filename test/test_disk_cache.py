@@ -0,0 +1,67 @@
+# coding=utf-8
+"""Disk cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from utils.disk_cache import DiskCache, fingerprint
+
+
+class DiskCacheTest(unittest.TestCase):
+    """Test the content-addressed disk cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        cache = DiskCache(self.directory, 10 * 1024 * 1024)
+        key = fingerprint("grid", 42, (0.0, 1.0))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {"building_area": np.arange(5.0)})
+        np.testing.assert_array_equal(cache.get(key)["building_area"], np.arange(5.0))
+
+    def test_corrupt_entry_is_dropped(self):
+        cache = DiskCache(self.directory, 10 * 1024 * 1024)
+        cache.put("a", {"values": np.ones(10)})
+        with open(os.path.join(self.directory, "a.npz"), "r+b") as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b"XXXX")
+        self.assertIsNone(cache.get("a"))
+        self.assertNotIn("a", cache)
+
+    def test_lru_eviction(self):
+        cache = DiskCache(self.directory, 10 * 1024 * 1024)
+        for key in ("a", "b", "c"):
+            cache.put(key, {"values": np.zeros(1000)})
+            time.sleep(0.01)
+        cache.get("a")
+        cache.max_bytes = cache.size() - 1
+        cache.evict()
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DiskCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
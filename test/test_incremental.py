@@ -0,0 +1,139 @@
+# coding=utf-8
+"""Incremental and tiled coverage test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import unittest
+
+import numpy as np
+from qgis.core import QgsFeature, QgsGeometry, QgsRectangle, QgsVectorLayer
+
+from utils.classification import calculate_coverage
+from utils.grid_tools import grid_to_layer, virtual_grid_layer
+from utils.hex_grid import HexGrid
+from utils.incremental import IncrementalCoverage
+from utils.matrix_calculation import classify_coverage
+from utils.regular_grid import RegularGrid
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+CRS = "EPSG:3857"
+
+
+def make_buildings(boxes):
+    """Memory polygon layer with one feature per (xmin, ymin, xmax, ymax) box."""
+    layer = QgsVectorLayer(f"Polygon?crs={CRS}", "buildings", "memory")
+    features = []
+    for box in boxes:
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(*box)))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def coverage_by_cell(layer, field="coverage_pct"):
+    """Maps grid_id to the coverage of each cell of a result layer."""
+    return {int(feature["grid_id"]): feature[field] for feature in layer.getFeatures()}
+
+
+def cells_in(layer, rects):
+    """grid_ids of the result cells intersecting any of the rectangles."""
+    return {int(feature["grid_id"]) for feature in layer.getFeatures()
+            if any(feature.geometry().boundingBox().intersects(rect) for rect in rects)}
+
+
+class IncrementalCoverageTest(unittest.TestCase):
+    """Test incremental updates, tiled and virtual coverage."""
+
+    def setUp(self):
+        """Runs before each test."""
+        grid = RegularGrid.from_extent(0, 0, 60, 40, 10)
+        # Leave a few cells out, so grid_id and feature position differ
+        self.grid_layer = grid_to_layer(grid, CRS, cell_ids=np.setdiff1d(np.arange(grid.n_cells), [0, 7, 13]))
+        self.buildings = make_buildings([
+            (2, 2, 8, 6), (12, 14, 19, 27), (24, 5, 37, 9), (41, 31, 58, 38), (45, 12, 47, 14)])
+
+    def assertMatchesFullRun(self, result):
+        expected = coverage_by_cell(calculate_coverage(self.grid_layer, self.buildings, use_cache=False))
+        actual = coverage_by_cell(result)
+        self.assertEqual(actual.keys(), expected.keys())
+        for grid_id, value in expected.items():
+            self.assertAlmostEqual(actual[grid_id], value, msg=f"grid_id {grid_id}")
+
+    def assertOnlyTouchedChanged(self, result, before, rects):
+        touched = cells_in(result, rects)
+        for grid_id, value in coverage_by_cell(result).items():
+            if grid_id not in touched:
+                self.assertEqual(value, before[grid_id], msg=f"grid_id {grid_id}")
+
+    def test_edits_update_touched_cells(self):
+        result = calculate_coverage(self.grid_layer, self.buildings, use_cache=False)
+        updater = IncrementalCoverage(result, self.buildings)
+        self.buildings.startEditing()
+        try:
+            # Move a building into the neighbouring cells
+            before = coverage_by_cell(result)
+            old = self.buildings.getFeature(1).geometry().boundingBox()
+            new = QgsRectangle(22, 21, 33, 33)
+            self.assertTrue(self.buildings.changeGeometry(1, QgsGeometry.fromRect(new)))
+            self.assertOnlyTouchedChanged(result, before, [old, new])
+            self.assertMatchesFullRun(result)
+
+            # Add a building across four cells
+            before = coverage_by_cell(result)
+            added = QgsRectangle(5, 25, 15, 35)
+            feature = QgsFeature(self.buildings.fields())
+            feature.setGeometry(QgsGeometry.fromRect(added))
+            self.assertTrue(self.buildings.addFeature(feature))
+            self.assertOnlyTouchedChanged(result, before, [added])
+            self.assertMatchesFullRun(result)
+
+            # Delete one
+            before = coverage_by_cell(result)
+            deleted = self.buildings.getFeature(3).geometry().boundingBox()
+            self.assertTrue(self.buildings.deleteFeatures([3]))
+            self.assertOnlyTouchedChanged(result, before, [deleted])
+            self.assertMatchesFullRun(result)
+        finally:
+            self.buildings.rollBack()
+            updater.disconnect()
+
+    def test_tiled_matches_in_memory(self):
+        expected = calculate_coverage(self.grid_layer, self.buildings, use_cache=False)
+        tiled = calculate_coverage(self.grid_layer, self.buildings, memory_budget_mb=0.01, use_cache=False)
+        self.assertEqual(tiled.featureCount(), expected.featureCount())
+        expected = coverage_by_cell(expected)
+        for grid_id, value in coverage_by_cell(tiled).items():
+            self.assertAlmostEqual(value, expected[grid_id], msg=f"grid_id {grid_id}")
+
+    def test_virtual_grid_classified_from_arrays(self):
+        thresholds = (10, 30, 60)
+        grid_layer = virtual_grid_layer(RegularGrid.from_extent(0, 0, 60, 40, 10), CRS)
+        result = calculate_coverage(grid_layer, self.buildings, use_cache=False, thresholds=thresholds)
+        self.assertEqual(result.featureCount(), 24)
+        for feature in result.getFeatures():
+            self.assertEqual(feature["density_class"], classify_coverage(feature["coverage_pct"], *thresholds))
+
+    def test_hex_grid_refuses_square_methods(self):
+        grid_layer = virtual_grid_layer(HexGrid.from_extent(0, 0, 60, 40, 10), CRS)
+        for method in ("regular", "raster"):
+            with self.assertRaises(ValueError):
+                calculate_coverage(grid_layer, self.buildings, method=method, use_cache=False)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(IncrementalCoverageTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Building index cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import mercantile
+import shapely
+
+from utils import ms_index
+
+INDEX_CSV = (
+    "Location,QuadKey,Url,Size,UploadDate\n"
+    "Germany,120210233,https://example.com/a.csv.gz,1.2MB,2023-04-25\n"
+    "Germany,120210233,https://example.com/b.csv.gz,800KB,2023-04-25\n"
+    "Germany,012021023,https://example.com/c.csv.gz,2.0MB,2023-04-25\n"
+)
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        IndexHandler.requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = INDEX_CSV.encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MsIndexTest(unittest.TestCase):
+    """Test the cached Microsoft building index."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.environ["URBANMATRIX_CACHE_DIR"] = self.directory
+        IndexHandler.requests_seen = []
+        ms_index._loaded_indexes.clear()
+        self.server = HTTPServer(("127.0.0.1", 0), IndexHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/dataset-links.csv"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        del os.environ["URBANMATRIX_CACHE_DIR"]
+        shutil.rmtree(self.directory)
+
+    def test_lookup_by_quadkey(self):
+        index = ms_index.load_index(self.url)
+        self.assertEqual([row["Url"] for row in index["120210233"]],
+                         ["https://example.com/a.csv.gz", "https://example.com/b.csv.gz"])
+        # Leading zeros are kept
+        self.assertIn("012021023", index)
+
+    def test_fresh_copy_makes_no_request(self):
+        ms_index.fetch_index(self.url)
+        ms_index.fetch_index(self.url)
+        self.assertEqual(len(IndexHandler.requests_seen), 1)
+
+    def test_plan_includes_every_partition(self):
+        index = ms_index.parse_index(ms_index.fetch_index(self.url))
+        aoi = shapely.box(*mercantile.bounds(mercantile.quadkey_to_tile("120210233"))).buffer(-0.01)
+        plan = ms_index.plan_tiles(index, aoi)
+        self.assertEqual([tile.url for tile in plan],
+                         ["https://example.com/a.csv.gz", "https://example.com/b.csv.gz"])
+        self.assertEqual(plan[0].size, int(1.2 * 1024 ** 2))
+        self.assertEqual(plan[1].size, 800 * 1024)
+        self.assertEqual(ms_index.describe_plan(plan), "2 files in 1 quadkeys, 2.0 MB")
+
+    def test_plan_follows_aoi_polygon(self):
+        tile = mercantile.quadkey_to_tile("120210233")
+        west, south, east, north = mercantile.bounds(tile)
+        # A thin diagonal strip: its bbox covers the 3x3 block around the
+        # tile, the strip itself only the diagonal
+        width, height = east - west, north - south
+        strip = shapely.LineString([(west - 0.5 * width, south - 0.5 * height),
+                                    (east + 0.5 * width, north + 0.5 * height)]).buffer(1e-3)
+        index = {mercantile.quadkey(t): [{"Url": mercantile.quadkey(t), "Size": "1KB"}]
+                 for t in mercantile.tiles(*strip.bounds, zooms=9)}
+        self.assertEqual(len(index), 9)
+        planned = [t.quadkey for t in ms_index.plan_tiles(index, strip)]
+        self.assertIn("120210233", planned)
+        self.assertLess(len(planned), 9)
+
+    def test_extent_to_wgs84(self):
+        aoi = ms_index.extent_to_wgs84((500000, 5400000, 510000, 5410000), "EPSG:32632")
+        self.assertGreater(len(aoi.exterior.coords), 5)
+        minx, miny, maxx, maxy = aoi.bounds
+        self.assertTrue(8.9 < minx < maxx < 9.2 and 48.7 < miny < maxy < 48.9)
+
+    def test_stale_copy_is_revalidated(self):
+        path = ms_index.fetch_index(self.url)
+        self.assertEqual(ms_index.fetch_index(self.url, ttl=0), path)
+        self.assertEqual(len(IndexHandler.requests_seen), 2)
+        self.assertEqual(IndexHandler.requests_seen[1].get("If-None-Match"), '"v1"')
+        self.assertIn("120210233", ms_index.parse_index(path))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(MsIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
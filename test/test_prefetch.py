@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Headless tile prefetch test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mercantile
+
+from utils import ms_index
+from utils.prefetch import main
+from utils.tile_store import TileStore, decode_tile
+
+QUADKEYS = ("120210233", "120210232")
+
+
+def tile_content(quadkey, part):
+    west, south, east, north = mercantile.bounds(mercantile.quadkey_to_tile(quadkey))
+    lines = []
+    for i in range(10):
+        x = west + (east - west) * (i + 0.5) / 10
+        y = south + (north - south) * (part + 0.5) / 3
+        ring = [[x, y], [x + 1e-4, y], [x + 1e-4, y + 1e-4], [x, y + 1e-4], [x, y]]
+        lines.append(json.dumps({"type": "Feature", "properties": {},
+                                 "geometry": {"type": "Polygon", "coordinates": [ring]}}))
+    return gzip.compress("\n".join(lines).encode("utf-8"))
+
+
+class MockTileHandler(BaseHTTPRequestHandler):
+    """Serves an index with two partitions per quadkey and their tiles."""
+
+    tile_requests = []
+
+    def do_GET(self):
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        if self.path == "/dataset-links.csv":
+            rows = ["Location,QuadKey,Url,Size,UploadDate"]
+            rows += [f"Test,{qk},{base}/{qk}/part-{part}.csv.gz,1KB,2023-04-25"
+                     for qk in QUADKEYS for part in range(2)]
+            body = "\n".join(rows).encode("utf-8")
+        else:
+            MockTileHandler.tile_requests.append(self.path)
+            quadkey, name = self.path.strip("/").split("/")
+            body = tile_content(quadkey, int(name[len("part-")]))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PrefetchTest(unittest.TestCase):
+    """Test pre-seeding the tile store from the command line entry point."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        MockTileHandler.tile_requests = []
+        ms_index._loaded_indexes.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockTileHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.index_url = f"http://127.0.0.1:{self.server.server_port}/dataset-links.csv"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.environ.pop("URBANMATRIX_CACHE_DIR", None)
+        shutil.rmtree(self.directory)
+
+    def test_prefetch_is_resumable(self):
+        west, south, east, north = mercantile.bounds(mercantile.quadkey_to_tile(QUADKEYS[0]))
+        bbox = [str(v) for v in (west + 0.01, south + 0.01, east - 0.01, north - 0.01)]
+        args = ["--bbox", *bbox, "--cache-dir", self.directory, "--index-url", self.index_url, "--workers", "2"]
+
+        self.assertEqual(main(args), 0)
+        self.assertEqual(len(MockTileHandler.tile_requests), 2)
+
+        store = TileStore()
+        for part in range(2):
+            url = f"http://127.0.0.1:{self.server.server_port}/{QUADKEYS[0]}/part-{part}.csv.gz"
+            self.assertEqual(len(decode_tile(store.get(QUADKEYS[0], url))), 10)
+
+        # A second run finds everything in the store
+        self.assertEqual(main(args), 0)
+        self.assertEqual(len(MockTileHandler.tile_requests), 2)
+
+    def test_region_larger_than_cache_is_refused(self):
+        west, south, east, north = mercantile.bounds(mercantile.quadkey_to_tile(QUADKEYS[0]))
+        bbox = [str(v) for v in (west + 0.01, south + 0.01, east - 0.01, north - 0.01)]
+        # Two 1 KB tiles do not fit in a 1 KB store
+        args = ["--bbox", *bbox, "--cache-dir", self.directory, "--index-url", self.index_url,
+                "--max-cache-mb", str(1 / 1024)]
+        self.assertEqual(main(args), 1)
+        self.assertEqual(MockTileHandler.tile_requests, [])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PrefetchTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Regular grid generation test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import unittest
+
+import numpy as np
+import shapely
+
+from utils.hex_grid import HexGrid
+from utils.raster_footprint import mark_valid_pixels
+from utils.regular_grid import RegularGrid
+
+
+class RegularGridTest(unittest.TestCase):
+    """Test vectorized cell generation."""
+
+    def test_from_extent_covers_extent(self):
+        grid = RegularGrid.from_extent(0, 0, 100, 55, 10)
+        self.assertEqual((grid.rows, grid.cols), (6, 10))
+        self.assertEqual((grid.x_max, grid.y_min), (100, -5))
+        # No extra column when the extent is an exact multiple
+        self.assertEqual(RegularGrid.from_extent(0, 0, 0.3, 0.1, 0.1).cols, 3)
+        with self.assertRaises(ValueError):
+            RegularGrid.from_extent(0, 0, 10, 10, 0)
+
+    def test_cells_round_trip_through_detect(self):
+        grid = RegularGrid.from_extent(0, 0, 40, 30, 10)
+        ids = np.arange(grid.n_cells)
+        cells = grid.cell_polygons(ids)
+        np.testing.assert_array_equal(shapely.bounds(cells[5]), [10, 10, 20, 20])
+
+        detected, row_idx, col_idx = RegularGrid.detect(cells)
+        self.assertEqual(detected.to_dict(), grid.to_dict())
+        np.testing.assert_array_equal(row_idx * grid.cols + col_idx, ids)
+        self.assertEqual(RegularGrid.from_dict(grid.to_dict()).to_dict(), grid.to_dict())
+
+    def test_block_sum_matches_coarse_grid(self):
+        grid = RegularGrid.from_extent(0, 0, 50, 30, 10)
+        values = np.arange(grid.n_cells, dtype=float)
+        coarse = grid.coarsen(2)
+        self.assertEqual((coarse.rows, coarse.cols, coarse.cell_width), (2, 3, 20))
+        sums = grid.block_sum(values, 2)
+        self.assertEqual(sums.sum(), values.sum())
+        # Top-left block holds cells 0, 1, 5 and 6; the last one only cell 14
+        self.assertEqual((sums[0], sums[-1]), (12, 14))
+
+    def test_coarse_cell_ids(self):
+        grid = RegularGrid.from_extent(0, 0, 50, 30, 10)
+        coarse = grid.coarsen(2)
+        # Cells 0 and 6 share the top-left block, 14 is alone in the last one
+        np.testing.assert_array_equal(grid.coarse_cell_ids([6, 14, 0], 2), [0, 5])
+        centres = shapely.centroid(grid.cell_polygons(np.array([3, 14])))
+        np.testing.assert_array_equal(
+            grid.coarse_cell_ids([3, 14], 2),
+            np.sort(coarse.cell_ids_at(shapely.get_x(centres), shapely.get_y(centres))))
+
+    def test_hex_grid_indexing(self):
+        grid = HexGrid.from_extent(0, 0, 40, 30, 10)
+        cells = grid.cell_polygons(np.arange(grid.n_cells))
+        np.testing.assert_allclose(shapely.area(cells), 100)
+        self.assertTrue(shapely.covers(shapely.union_all(shapely.buffer(cells, 1e-9)), shapely.box(0, 0, 40, 30)))
+
+        # Closed-form point lookup agrees with a point-in-polygon join
+        rng = np.random.default_rng(0)
+        x = rng.uniform(grid.x_min, grid.x_max, 5000)
+        y = rng.uniform(grid.y_min, grid.y_max, 5000)
+        point_idx, cell_idx = shapely.STRtree(cells).query(shapely.points(x, y), predicate="within")
+        expected = np.full(len(x), -1)
+        expected[point_idx] = cell_idx
+        np.testing.assert_array_equal(grid.cell_ids_at(x, y), expected)
+
+        q, r = grid.axial([grid.cols + 1])
+        self.assertEqual((q[0], r[0]), (1, 1))
+        self.assertEqual(HexGrid.from_dict(grid.to_dict()).to_dict(), grid.to_dict())
+
+    def test_valid_cells_from_pixel_mask(self):
+        grid = RegularGrid.from_extent(0, 0, 40, 30, 10)
+        # 2 m pixels, valid only in the lower-left triangle
+        rows, cols = np.mgrid[0:15, 0:20]
+        valid = cols < (rows - 5) * 2
+        transform = (0.0, 2.0, 0.0, 30.0, 0.0, -2.0)
+
+        mask = np.zeros((grid.rows, grid.cols), dtype=bool)
+        # Read in two strips, as from a block-wise reader
+        mark_valid_pixels(mask, grid, valid[:8], transform)
+        mark_valid_pixels(mask, grid, valid[8:], transform, row_offset=8)
+        np.testing.assert_array_equal(mask, [[False, False, False, False],
+                                             [True, True, False, False],
+                                             [True, True, True, True]])
+
+    def test_valid_pixel_straddling_cells(self):
+        grid = RegularGrid.from_extent(0, 0, 40, 20, 10)
+        # One valid 8 m pixel spanning x 6-14 and y 8-16
+        valid = np.zeros((2, 3), dtype=bool)
+        valid[0, 1] = True
+        transform = (-2.0, 8.0, 0.0, 16.0, 0.0, -8.0)
+        mask = mark_valid_pixels(np.zeros((grid.rows, grid.cols), dtype=bool), grid, valid, transform)
+        np.testing.assert_array_equal(mask, [[True, True, False, False],
+                                             [True, True, False, False]])
+
+        # Same on a hex grid: every hexagon touched by the pixel's interior
+        hex_grid = HexGrid.from_extent(0, 0, 40, 20, 10)
+        mask = mark_valid_pixels(np.zeros((hex_grid.rows, hex_grid.cols), dtype=bool), hex_grid, valid, transform)
+        pixel = shapely.box(6, 8, 14, 16)
+        cells = hex_grid.cell_polygons(np.arange(hex_grid.n_cells))
+        expected = shapely.intersects(cells, pixel) & ~shapely.touches(cells, pixel)
+        np.testing.assert_array_equal(mask.ravel(), expected)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RegularGridTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
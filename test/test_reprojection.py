@@ -0,0 +1,67 @@
+# coding=utf-8
+"""AOI prefilter and chunked reprojection test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.ms_index import extent_to_wgs84
+from utils.reprojection import clip_to_aoi, reproject_geometries, select_in_aoi
+
+EXTENT = (495000, 5395000, 505000, 5405000)
+CRS = "EPSG:32632"
+
+
+def make_buildings(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(8.8, 9.2, n)
+    y = rng.uniform(48.6, 48.9, n)
+    return shapely.box(x, y, x + 1e-4, y + 1e-4)
+
+
+class ReprojectionTest(unittest.TestCase):
+    """Test filtering in EPSG:4326 before reprojecting."""
+
+    def test_reprojection_matches_geopandas(self):
+        geoms = make_buildings()
+        expected = gpd.GeoSeries(geoms, crs="EPSG:4326").to_crs(CRS).values
+        for workers in (1, 3):
+            result = reproject_geometries(geoms, "EPSG:4326", CRS, workers=workers, chunk_size=3000)
+            self.assertTrue(shapely.equals_exact(result, np.asarray(expected, dtype=object), 1e-6).all())
+
+    def test_prefilter_keeps_every_intersecting_building(self):
+        geoms = make_buildings()
+        rect = shapely.box(*EXTENT)
+        projected = np.asarray(gpd.GeoSeries(geoms, crs="EPSG:4326").to_crs(CRS).values, dtype=object)
+        expected = np.flatnonzero(shapely.intersects(projected, rect))
+
+        keep = select_in_aoi(geoms, extent_to_wgs84(EXTENT, CRS))
+        self.assertTrue(set(expected) <= set(keep.tolist()))
+        self.assertLess(len(keep), len(geoms) / 4)
+
+        selected = reproject_geometries(geoms[keep], "EPSG:4326", CRS)
+        self.assertEqual(shapely.intersects(selected, rect).sum(), len(expected))
+
+    def test_buildings_without_crs_are_refused(self):
+        aoi = extent_to_wgs84(EXTENT, CRS)
+        with self.assertRaises(ValueError):
+            clip_to_aoi(gpd.GeoDataFrame(geometry=make_buildings()), CRS, aoi, shapely.box(*EXTENT))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ReprojectionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
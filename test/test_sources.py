@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Building source registry test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+import geopandas as gpd
+import mercantile
+import numpy as np
+import shapely
+
+from test_prefetch import QUADKEYS, MockTileHandler
+from utils.sources import LocalFileSource, MicrosoftBuildings, get_source, register_source, source_names
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class SourcesTest(unittest.TestCase):
+    """Test the building source registry and the local file backend."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_registry(self):
+        self.assertIn("Microsoft Buildings", source_names())
+        self.assertIsInstance(get_source("Microsoft Buildings"), MicrosoftBuildings)
+        source = register_source(LocalFileSource(os.path.join(self.directory, "city.parquet")))
+        self.assertIs(get_source("Local: city.parquet"), source)
+        with self.assertRaises(ValueError):
+            get_source("Unknown")
+
+    def test_directory_plan(self):
+        for name in ("a.parquet", "b.fgb", "notes.txt"):
+            open(os.path.join(self.directory, name), "w").close()
+        source = LocalFileSource(self.directory)
+        plan = source.plan(shapely.box(0, 0, 1, 1))
+        self.assertEqual([os.path.basename(path) for path in plan], ["a.parquet", "b.fgb"])
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_bbox_read(self):
+        self._check_parquet_read(write_covering_bbox=True)
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_read_without_covering(self):
+        # Plain GeoDataFrame.to_parquet() output, without a bbox column
+        self._check_parquet_read()
+
+    def _check_parquet_read(self, **options):
+        rng = np.random.default_rng(0)
+        x = rng.uniform(500000, 510000, 5000)
+        y = rng.uniform(5400000, 5410000, 5000)
+        buildings = gpd.GeoDataFrame(geometry=shapely.box(x, y, x + 10, y + 10), crs="EPSG:32632")
+        path = os.path.join(self.directory, "buildings.parquet")
+        buildings.to_parquet(path, row_group_size=500, **options)
+
+        aoi = gpd.GeoSeries([shapely.box(502000, 5402000, 503000, 5403000)], crs="EPSG:32632")
+        aoi_wgs84 = aoi.to_crs("EPSG:4326").iloc[0]
+        source = LocalFileSource(path)
+        batches = list(source.batches(source.plan(aoi_wgs84), aoi_wgs84))
+        self.assertEqual(len(batches), 1)
+        _, gdf, error = batches[0]
+        self.assertIsNone(error)
+        self.assertEqual(gdf.crs, buildings.crs)
+
+        # Everything intersecting the AOI is read, far away buildings are not
+        expected = buildings.geometry.intersects(aoi.iloc[0]).sum()
+        self.assertEqual(gdf.geometry.intersects(aoi.iloc[0]).sum(), expected)
+        self.assertLess(len(gdf), len(buildings) / 4)
+
+    def test_microsoft_batches(self):
+        os.environ["URBANMATRIX_CACHE_DIR"] = self.directory
+        server = ThreadingHTTPServer(("127.0.0.1", 0), MockTileHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            MockTileHandler.tile_requests = []
+            source = MicrosoftBuildings(f"http://127.0.0.1:{server.server_port}/dataset-links.csv")
+            aoi = shapely.box(*mercantile.bounds(mercantile.quadkey_to_tile(QUADKEYS[0]))).buffer(-0.01)
+            plan = source.plan(aoi)
+            for _ in range(2):
+                batches = list(source.batches(plan, aoi, workers=2))
+                self.assertEqual([error for _, _, error in batches], [None, None])
+                self.assertEqual(sum(len(gdf) for _, gdf, _ in batches), 20)
+            # The second pass is served from the tile store
+            self.assertEqual(len(MockTileHandler.tile_requests), 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            del os.environ["URBANMATRIX_CACHE_DIR"]
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SourcesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
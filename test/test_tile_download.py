@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Concurrent tile download test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.tile_download import download_tiles
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """Serves /ok/<n>, fails /flaky/<n> once with a 503 and /missing with a 404,
+    and cuts /truncated/<n> off mid-body once."""
+
+    lock = threading.Lock()
+    hits = {}
+    active = 0
+    max_active = 0
+
+    def do_GET(self):
+        cls = TileHandler
+        with cls.lock:
+            cls.hits[self.path] = cls.hits.get(self.path, 0) + 1
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            hits = cls.hits[self.path]
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+
+        if self.path.startswith("/missing") or (self.path.startswith("/flaky") and hits == 1):
+            self.send_response(404 if self.path.startswith("/missing") else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.path.encode("ascii")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.path.startswith("/truncated") and hits == 1:
+            # Announce the whole body, send half of it and drop the connection
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TileDownloadTest(unittest.TestCase):
+    """Test the concurrent tile download scheduler."""
+
+    def setUp(self):
+        TileHandler.hits = {}
+        TileHandler.active = TileHandler.max_active = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def download(self, tiles, **kwargs):
+        statuses = []
+        results = download_tiles(
+            tiles, lambda key, url, content: content.decode("ascii"), backoff=0.01,
+            on_status=lambda key, status, info=None: statuses.append((key, status)), **kwargs)
+        return {key: (result, error) for key, result, error in results}, statuses
+
+    def test_bounded_concurrency(self):
+        tiles = [(str(i), f"{self.base}/ok/{i}") for i in range(12)]
+        results, statuses = self.download(tiles, workers=3)
+        self.assertEqual({key: result for key, (result, _) in results.items()},
+                         {str(i): f"/ok/{i}" for i in range(12)})
+        self.assertLessEqual(TileHandler.max_active, 3)
+        self.assertEqual(sum(status == "done" for _, status in statuses), 12)
+
+    def test_retry_and_failure(self):
+        tiles = [("flaky", f"{self.base}/flaky/1"), ("missing", f"{self.base}/missing/1")]
+        results, statuses = self.download(tiles, workers=2, retries=2)
+        self.assertEqual(results["flaky"], ("/flaky/1", None))
+        self.assertIn(("flaky", "retrying"), statuses)
+        self.assertIsNone(results["missing"][0])
+        self.assertIsNotNone(results["missing"][1])
+        # Client errors are not retried
+        self.assertEqual(TileHandler.hits["/missing/1"], 1)
+        self.assertIn(("missing", "failed"), statuses)
+
+    def test_retry_dropped_body(self):
+        results, statuses = self.download([("truncated", f"{self.base}/truncated/1")], retries=2)
+        self.assertEqual(results["truncated"], ("/truncated/1", None))
+        self.assertIn(("truncated", "retrying"), statuses)
+        self.assertEqual(TileHandler.hits["/truncated/1"], 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileDownloadTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
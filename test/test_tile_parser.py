@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Streaming building tile parser test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import gzip
+import json
+import unittest
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from utils.tile_parser import iter_lines, parse_tile
+from utils.tile_store import decode_tile
+
+
+def make_records(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(8.0, 9.0, n)
+    y = rng.uniform(48.0, 49.0, n)
+    records = []
+    for i in range(n):
+        ring = [[x[i], y[i]], [x[i] + 1e-4, y[i]], [x[i] + 1e-4, y[i] + 1e-4], [x[i], y[i] + 1e-4], [x[i], y[i]]]
+        records.append({"type": "Feature", "properties": {"height": -1, "confidence": 0.9},
+                        "geometry": {"type": "Polygon", "coordinates": [ring]}})
+    return records
+
+
+def encode_lines(records):
+    return gzip.compress("\n".join(json.dumps(record) for record in records).encode("utf-8"))
+
+
+class TileParserTest(unittest.TestCase):
+    """Test the streaming tile parser."""
+
+    def test_full_tile(self):
+        records = make_records()
+        geoms = decode_tile(parse_tile(iter_lines(encode_lines(records))))
+        expected = [shape(record["geometry"]) for record in records]
+        self.assertTrue(shapely.equals(geoms, expected).all())
+
+    def test_bbox_prefilter(self):
+        records = make_records()
+        bbox = (8.3, 48.3, 8.4, 48.5)
+        geoms = decode_tile(parse_tile(iter_lines(encode_lines(records)), bbox))
+        expected = np.array([shape(record["geometry"]) for record in records], dtype=object)
+        expected = expected[shapely.intersects(shapely.envelope(expected), shapely.box(*bbox))]
+        self.assertGreater(len(expected), 0)
+        self.assertTrue(shapely.equals(geoms, expected).all())
+
+    def test_multipolygon_and_plain_lines(self):
+        records = make_records(3)
+        records.append({"type": "Feature", "properties": {},
+                        "geometry": {"type": "MultiPolygon", "coordinates": [
+                            [[[8, 48], [8.1, 48], [8.1, 48.1], [8, 48]]],
+                            [[[8.2, 48], [8.3, 48], [8.3, 48.1], [8.2, 48]]]]}})
+        content = "\n".join(json.dumps(record) for record in records).encode("utf-8")
+        geoms = decode_tile(parse_tile(iter_lines(content)))
+        self.assertEqual(len(geoms), 4)
+        self.assertEqual(shapely.get_num_geometries(geoms).tolist(), [1, 1, 1, 2])
+        self.assertEqual(len(decode_tile(parse_tile(iter_lines(content), (0, 0, 1, 1)))), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileParserTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
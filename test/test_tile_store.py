@@ -0,0 +1,70 @@
+# coding=utf-8
+"""Building tile store test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'crivisan1994@gmail.com'
+__date__ = '2025-04-08'
+__copyright__ = 'Copyright 2025, Cristhian Sanchez'
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import shapely
+
+from utils.tile_store import TileStore, decode_tile, encode_tile
+
+
+def make_tile(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(8.0, 9.0, n)
+    y = rng.uniform(48.0, 49.0, n)
+    geoms = shapely.box(x, y, x + 1e-4, y + 1e-4)
+    # A building with a courtyard
+    geoms[0] = shapely.Polygon([(8, 48), (8.01, 48), (8.01, 48.01), (8, 48.01)],
+                               [[(8.002, 48.002), (8.004, 48.002), (8.004, 48.004), (8.002, 48.004)]])
+    return geoms
+
+
+class TileStoreTest(unittest.TestCase):
+    """Test the columnar building tile store."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        geoms = make_tile()
+        store = TileStore(self.directory)
+        store.put("120210233", "https://example.com/a.csv.gz", encode_tile(geoms))
+        self.assertIn(("120210233", "https://example.com/a.csv.gz"), store)
+        self.assertNotIn(("120210233", "https://example.com/b.csv.gz"), store)
+        decoded = decode_tile(store.get("120210233", "https://example.com/a.csv.gz"))
+        self.assertTrue(shapely.equals(decoded, geoms).all())
+
+    def test_bbox_selection(self):
+        geoms = make_tile()
+        bbox = (8.2, 48.2, 8.5, 48.4)
+        expected = geoms[shapely.intersects(shapely.envelope(geoms), shapely.box(*bbox))]
+        selected = decode_tile(encode_tile(geoms), bbox)
+        self.assertGreater(len(selected), 0)
+        self.assertTrue(shapely.equals(selected, expected).all())
+        self.assertEqual(len(decode_tile(encode_tile(geoms), (0, 0, 1, 1))), 0)
+
+    def test_empty_tile(self):
+        self.assertEqual(len(decode_tile(encode_tile([]))), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -1,70 +1,420 @@
-def calculate_coverage(grid_layer, feature_layer, output_field="coverage_pct"):
-    import geopandas as gpd
-    import pandas as pd
-    import tempfile
-    import os
-    from qgis.core import (
-        QgsVectorLayer, QgsFeature, QgsGeometry, QgsField, QgsFields,
-        QgsCoordinateReferenceSystem, QgsVectorFileWriter
-    )
-    from qgis.PyQt.QtCore import QVariant
+# Column holding each cell's position in the grid layer, the index of the
+# cached and returned per-cell result arrays
+CELL_POSITION = "_cell_position"
+
+
+def calculate_coverage(grid_layer, feature_layer, output_field="coverage_pct", method=None, resolution=1.0,
+                       memory_budget_mb=None, workers=1, use_cache=True, metrics=(), thresholds=None):
+    """
+    Calculates the percentage of each grid cell covered by the feature layer.
+
+    :param grid_layer: Polygon grid QgsVectorLayer
+    :param feature_layer: Polygon QgsVectorLayer (e.g. buildings)
+    :param output_field: Name of the coverage percentage field
+    :param method: Coverage backend, one of coverage.BACKENDS
+        (defaults to coverage.DEFAULT_BACKEND); "raster" is approximate
+    :param resolution: Sub-cell pixel size (map units) for the "raster" method
+    :param memory_budget_mb: If set, process the grid in spatial blocks sized
+        to this budget and stream them into the output layer
+    :param workers: Number of worker processes for the exact methods
+    :param use_cache: Reuse per-cell results from the on-disk coverage cache
+        when grid, features and parameters are unchanged
+    :param metrics: Extra per-cell aggregates from coverage.METRICS, computed
+        in the same pass and written as additional fields
+    :param thresholds: Optional (low, mid, high) coverage thresholds; the
+        result then also gets its Matrix Method density_class
+    :return: QgsVectorLayer in memory with building_area and coverage fields
+
+    Virtual grid layers (see grid_tools.virtual_grid_layer) are computed on
+    the implicit grid with the exact method, in one pass and without a
+    memory budget; their cells are only built for the output layer. The
+    same path serves complete hex grids with the "auto" method.
+    """
+    from .coverage import BACKENDS, DEFAULT_BACKEND, METRICS
+    from .grid_tools import grid_from_layer, is_virtual_grid
+    from .hex_grid import HexGrid
+    from .layer_conversion import layer_to_geodataframe, geodataframe_to_layer
+    from .matrix_calculation import assign_matrix_scores
+
+    method = method or DEFAULT_BACKEND
+    if method not in BACKENDS:
+        raise ValueError(f"Unknown coverage method '{method}'. Choose one of {BACKENDS}.")
+
+    if workers > 1 and method in ("raster", "overlay"):
+        raise ValueError(f"Parallel coverage is not available for the {method} method.")
+
+    metrics = tuple(metrics)
+    if set(metrics) - set(METRICS):
+        raise ValueError(f"Unknown coverage metrics {metrics}. Choose from {METRICS}.")
+    if metrics and method in ("raster", "overlay"):
+        raise ValueError(f"Extra metrics are not available for the {method} method.")
+
+    if memory_budget_mb and method == "overlay":
+        raise ValueError("Tiled coverage is not available for the overlay method.")
+
+    spec_grid = grid_from_layer(grid_layer)
+    if isinstance(spec_grid, HexGrid) and method in ("regular", "raster"):
+        # Both rely on square cells; the exact method bins hexagons arithmetically
+        raise ValueError(f"The {method} method needs square cells; use the exact method on hexagonal grids.")
+
+    virtual_grid = spec_grid if is_virtual_grid(grid_layer) else None
+    if virtual_grid is None and method == "auto" and not memory_budget_mb:
+        # Complete hex grids are binned arithmetically as well
+        if isinstance(spec_grid, HexGrid) and grid_layer.featureCount() == spec_grid.n_cells:
+            virtual_grid = spec_grid
+    if virtual_grid is not None and method not in ("auto", "regular"):
+        raise ValueError(f"Virtual grids are not available for the {method} method.")
+    n_cells = virtual_grid.n_cells if virtual_grid is not None else grid_layer.featureCount()
+
+    cache = cache_key = cached = None
+    if use_cache:
+        from .coverage_cache import coverage_key, get_coverage_cache
+        cache = get_coverage_cache()
+        # All exact methods produce the same areas, so they share entries
+        mode = ("raster", float(resolution)) if method == "raster" else ("exact",)
+        # A virtual grid layer only holds the outline, so the spec tells grids apart
+        spec = (grid_layer.customProperty("urbanmatrix/grid"),) if virtual_grid is not None else ()
+        cache_key = coverage_key(grid_layer, feature_layer, output_field, mode, metrics, *spec)
+        cached = cache.get(cache_key)
+        if cached is not None and len(cached["building_area"]) != n_cells:
+            cached = None
+        if cached is not None:
+            print("[INFO] Coverage cache hit, skipping geometry work")
+
+    if virtual_grid is not None:
+        mem_layer, results = _calculate_coverage_virtual(virtual_grid, grid_layer, feature_layer, output_field,
+                                                         cached, metrics, thresholds)
+    elif memory_budget_mb:
+        mem_layer, results = _calculate_coverage_tiled(grid_layer, feature_layer, output_field, method, resolution,
+                                                       memory_budget_mb, workers, cached, metrics)
+    else:
+        # Pull the grid into GeoPandas in memory (WKB, no temp files)
+        grid = layer_to_geodataframe(grid_layer)
+
+        # Cached/result arrays are indexed by layer position; generated grids
+        # keep their own stable grid_id, other grids get the position
+        grid[CELL_POSITION] = range(len(grid))
+        if "grid_id" not in grid.columns:
+            grid["grid_id"] = grid[CELL_POSITION]
 
-    # Save both layers to temp files
-    temp_dir = tempfile.gettempdir()
-    grid_path = os.path.join(temp_dir, "temp_grid.geojson")
-    feature_path = os.path.join(temp_dir, "temp_features.geojson")
-    QgsVectorFileWriter.writeAsVectorFormat(grid_layer, grid_path, "UTF-8", grid_layer.crs(), "GeoJSON")
-    QgsVectorFileWriter.writeAsVectorFormat(feature_layer, feature_path, "UTF-8", feature_layer.crs(), "GeoJSON")
+        features = None
+        if cached is None:
+            features = layer_to_geodataframe(feature_layer, attributes=False)
+            if grid.crs != features.crs:
+                features = features.to_crs(grid.crs)
 
-    # Load into GeoPandas
-    grid = gpd.read_file(grid_path)
-    features = gpd.read_file(feature_path)
+        grid = _add_coverage(grid, features, output_field, method, resolution, workers, cached, metrics)
+        results = _collect_results(grid, _result_columns(output_field, method, metrics), len(grid))
 
-    if grid.crs != features.crs:
-        features = features.to_crs(grid.crs)
+        # Build QGIS memory layer
+        mem_layer = geodataframe_to_layer(grid.drop(columns=CELL_POSITION), "Building Density",
+                                          grid_layer.crs().authid())
+
+    if cache is not None and cached is None and results:
+        cache.put(cache_key, results)
+
+    if method == "raster":
+        _report_error_bound(mem_layer, output_field, resolution)
+
+    # Remember where the result came from (used by incremental updates)
+    mem_layer.setCustomProperty("urbanmatrix/grid_layer_id", grid_layer.id())
+    mem_layer.setCustomProperty("urbanmatrix/feature_layer_id", feature_layer.id())
+    mem_layer.setCustomProperty("urbanmatrix/coverage_method", method)
+    mem_layer.setCustomProperty("urbanmatrix/coverage_resolution", resolution)
+    mem_layer.setCustomProperty("urbanmatrix/coverage_field", output_field)
+    mem_layer.setCustomProperty("urbanmatrix/coverage_metrics", list(metrics))
+
+    if thresholds is not None:
+        if mem_layer.fields().indexOf("density_class") < 0:
+            assign_matrix_scores(mem_layer, *thresholds, input_field=output_field)
+        else:
+            # Classified from the result arrays when the layer was built
+            mem_layer.setCustomProperty("urbanmatrix/thresholds", list(thresholds))
+    return mem_layer
+
+
+def _result_columns(output_field, method, metrics=()):
+    """
+    Per-cell result columns computed by _add_coverage (and cached).
+    """
+    columns = ["building_area", *metrics, output_field]
+    if method == "raster":
+        columns.append(f"{output_field}_err")
+    return columns
+
+
+def _collect_results(grid, columns, n_cells, results=None):
+    """
+    Copies result columns into arrays indexed by cell position.
+    """
+    import numpy as np
+
+    if results is None:
+        results = {name: np.zeros(n_cells) for name in columns}
+    ids = grid[CELL_POSITION].to_numpy(dtype=int)
+    for name in columns:
+        results[name][ids] = grid[name].to_numpy(dtype=float)
+    return results
+
+
+def _add_coverage(grid, features, output_field, method, resolution, workers=1, cached=None, metrics=(),
+                  pool=None):
+    """
+    Adds cell_area, building_area and coverage columns to a grid GeoDataFrame.
+
+    With cached results (arrays indexed by cell position) no geometry work is done.
+    An optional worker pool is reused by the exact methods when workers > 1.
+    """
+    import geopandas as gpd
+    import pandas as pd
+    from .coverage import building_area_raster, coverage_metrics
 
-    # Add grid_id from original index
-    grid["grid_id"] = grid.index
     grid["cell_area"] = grid.geometry.area
 
-    # Clip buildings to grid cells
-    clipped = gpd.overlay(features, grid, how="intersection")
+    if cached is not None:
+        ids = grid[CELL_POSITION].to_numpy(dtype=int)
+        for name in _result_columns(output_field, method, metrics):
+            grid[name] = cached[name][ids]
+        return grid
 
-    # Calculate clipped area
-    clipped["building_area"] = clipped.geometry.area
+    errors = None
+    if method == "raster":
+        # Approximate: rasterized at sub-cell resolution and block-summed
+        grid["building_area"], errors = building_area_raster(
+            grid.geometry.values, features.geometry.values, resolution)
+    elif method != "overlay":
+        # Only the per-cell numbers are materialized, all metrics in one pass
+        results = coverage_metrics(grid.geometry.values, features.geometry.values, method, metrics, workers, pool)
+        for name, values in results.items():
+            grid[name] = values
+    else:
+        # Clip buildings to grid cells
+        clipped = gpd.overlay(features, grid, how="intersection")
 
-    # Sum building area per grid cell
-    stats = clipped.groupby("grid_id")["building_area"].sum().reset_index()
+        # Calculate clipped area
+        clipped["building_area"] = clipped.geometry.area
 
-    # Merge back into grid
-    grid = pd.merge(grid, stats, on="grid_id", how="left")
-    grid["building_area"] = grid["building_area"].fillna(0)
+        # Sum building area per grid cell
+        stats = clipped.groupby(CELL_POSITION)["building_area"].sum().reset_index()
+
+        # Merge back into grid
+        grid = pd.merge(grid, stats, on=CELL_POSITION, how="left")
+        grid["building_area"] = grid["building_area"].fillna(0)
 
     # Calculate coverage %
     grid[output_field] = (grid["building_area"] / grid["cell_area"]) * 100
 
-    # Build QGIS memory layer
-    crs = QgsCoordinateReferenceSystem(grid_layer.crs().authid())
+    if errors is not None:
+        # Per-cell error bound of the approximate mode, in coverage percent
+        grid[f"{output_field}_err"] = (errors / grid["cell_area"]) * 100
+    return grid
+
+
+def _report_error_bound(layer, output_field, resolution):
+    """
+    Summarizes the per-cell error bound of the approximate mode on the layer.
+    """
+    errors = [feature[f"{output_field}_err"] for feature in layer.getFeatures()]
+    max_error = max(errors, default=0.0)
+    mean_error = sum(errors) / len(errors) if errors else 0.0
+    print(f"[INFO] Approximate coverage at {resolution} map units: error bound "
+          f"max {max_error:.2f}%, mean {mean_error:.2f}% per cell")
+    layer.setCustomProperty("urbanmatrix/coverage_error_pct", max_error)
+
+
+def _grid_features(grid, crs, feature_layer):
+    """
+    Loads the feature geometries within a RegularGrid's extent, in the grid CRS.
+
+    :param crs: QgsCoordinateReferenceSystem of the grid
+    """
+    from qgis.core import QgsCoordinateTransform, QgsFeatureRequest, QgsProject, QgsRectangle
+    from .layer_conversion import layer_to_geodataframe
+
+    to_features = QgsCoordinateTransform(crs, feature_layer.crs(), QgsProject.instance())
+    extent = to_features.transformBoundingBox(QgsRectangle(grid.x_min, grid.y_min, grid.x_max, grid.y_max))
+    features = layer_to_geodataframe(feature_layer, QgsFeatureRequest().setFilterRect(extent), attributes=False)
+    if features.crs != crs.authid():
+        features = features.to_crs(crs.authid())
+    return features.geometry.values
+
+
+def _calculate_coverage_virtual(grid, grid_layer, feature_layer, output_field, cached=None, metrics=(),
+                                thresholds=None):
+    """
+    Computes coverage on an implicit RegularGrid or HexGrid into dense per-cell arrays,
+    then publishes every cell with its results as a memory layer. With
+    thresholds, the density class is computed on the arrays as well.
+
+    :return: Tuple (memory layer, per-cell result arrays indexed by grid_id)
+    """
+    import numpy as np
+    from .coverage import grid_metrics
+    from .grid_tools import grid_to_layer
+    from .matrix_calculation import classify_coverage_array
+
+    columns = _result_columns(output_field, "auto", metrics)
+    if cached is None:
+        results = grid_metrics(grid, _grid_features(grid, grid_layer.crs(), feature_layer), metrics)
+        results[output_field] = results["building_area"] / grid.cell_area * 100
+        results = {name: results[name] for name in columns}
+    else:
+        results = {name: cached[name] for name in columns}
+
+    print(f"[INFO] Virtual grid coverage done, building {grid.n_cells} cells")
+    values = {"cell_area": np.full(grid.n_cells, grid.cell_area), **results}
+    if thresholds is not None:
+        values["density_class"] = classify_coverage_array(results[output_field], *thresholds)
+    mem_layer = grid_to_layer(grid, grid_layer.crs().authid(), "Building Density", values=values)
+    return mem_layer, results
+
+
+def calculate_coverage_pyramid(grid_layer, feature_layer, factors=(1, 2, 4, 10), output_field="coverage_pct",
+                               thresholds=None):
+    """
+    Calculates coverage for several cell sizes from one exact pass.
+
+    Building area is computed once on the implicit fine grid the layer was
+    generated from; each level then sums factor x factor blocks of that
+    area array, so coarser levels need no geometry work. Coverage of coarse
+    cells reaching past the fine grid is relative to the part inside it.
+    Grids restricted to valid raster data only get the coarse cells holding
+    at least one of their cells, so no level reaches over the nodata collar.
+
+    :param grid_layer: Grid layer made by create_grid_from_raster
+    :param feature_layer: Polygon QgsVectorLayer (e.g. buildings)
+    :param factors: Cell size multipliers of the levels (1 is the fine grid)
+    :param output_field: Name of the coverage percentage field
+    :param thresholds: Optional (low, mid, high) coverage thresholds; each
+        level then also gets its Matrix Method density_class
+    :return: List of (cell size, memory layer), finest first
+    """
+    import numpy as np
+    from .coverage import grid_metrics
+    from .matrix_calculation import classify_coverage_array
+    from qgis.core import QgsFeatureRequest
+    from .grid_tools import grid_from_layer, grid_to_layer, is_virtual_grid
+    from .regular_grid import RegularGrid
+
+    grid = grid_from_layer(grid_layer)
+    if grid is None:
+        raise ValueError("The pyramid needs a grid generated by UrbanMatrix.")
+    if not isinstance(grid, RegularGrid):
+        raise ValueError("The pyramid needs a square grid.")
+    factors = sorted({int(factor) for factor in factors})
+    if not factors or factors[0] < 1:
+        raise ValueError("Pyramid factors must be positive integers.")
+
+    # Cells actually present in the layer (all of them unless masked)
+    cell_ids = None
+    if not is_virtual_grid(grid_layer) and grid_layer.featureCount() != grid.n_cells:
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(["grid_id"], grid_layer.fields())
+        cell_ids = np.sort([int(feature["grid_id"]) for feature in grid_layer.getFeatures(request)])
+
+    building_area = grid_metrics(grid, _grid_features(grid, grid_layer.crs(), feature_layer))["building_area"]
+
+    levels = []
+    for factor in factors:
+        level = grid.coarsen(factor)
+        area = grid.block_sum(building_area, factor) if factor > 1 else building_area
+        # Edge cells past the fine grid only count the area of the cells they hold
+        cell_area = grid.block_area(factor)
+        values = {"cell_area": cell_area, "building_area": area, output_field: area / cell_area * 100}
+        if thresholds is not None:
+            values["density_class"] = classify_coverage_array(values[output_field], *thresholds)
+        level_ids = None if cell_ids is None else grid.coarse_cell_ids(cell_ids, factor)
+        layer = grid_to_layer(level, grid_layer.crs().authid(), f"Building Density {level.cell_width:g}",
+                              values=values, cell_ids=level_ids)
+        layer.setCustomProperty("urbanmatrix/coverage_field", output_field)
+        layer.setCustomProperty("urbanmatrix/pyramid_factor", factor)
+        if thresholds is not None:
+            layer.setCustomProperty("urbanmatrix/thresholds", list(thresholds))
+        print(f"[INFO] Pyramid level {level.cell_width:g}: {layer.featureCount()} cells")
+        levels.append((level.cell_width, layer))
+    return levels
+
+
+def _calculate_coverage_tiled(grid_layer, feature_layer, output_field, method, resolution, memory_budget_mb,
+                              workers=1, cached=None, metrics=()):
+    """
+    Computes coverage block by block, keeping memory bounded by the budget.
+
+    Each cell belongs to the block containing its centre; buildings are loaded
+    per block with a rectangle filter, so those crossing the block edge are
+    included. Finished blocks are streamed into the output memory layer.
+
+    :return: Tuple (memory layer, per-cell result arrays indexed by cell position)
+    """
+    from qgis.core import (
+        QgsVectorLayer, QgsFeatureRequest, QgsField, QgsFields, QgsRectangle,
+        QgsCoordinateTransform, QgsProject
+    )
+    from qgis.PyQt.QtCore import QVariant
+    from contextlib import nullcontext
+    from .coverage import split_extent, worker_pool
+    from .layer_conversion import layer_to_geodataframe, write_geodataframe
+
+    # Positions follow the layer iteration order, as in the in-memory path
+    id_request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([])
+    positions = {feature.id(): i for i, feature in enumerate(grid_layer.getFeatures(id_request))}
+
+    extent = grid_layer.extent()
+    blocks = split_extent(
+        (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()),
+        memory_budget_mb, len(positions), feature_layer.featureCount())
+    print(f"[INFO] Tiled coverage: {len(blocks)} blocks for a {memory_budget_mb} MB budget")
+
+    to_features = QgsCoordinateTransform(grid_layer.crs(), feature_layer.crs(), QgsProject.instance())
+
+    columns = _result_columns(output_field, method, metrics)
+    added = ["grid_id", "cell_area"] + columns
     fields = QgsFields()
-    for col in grid.columns:
-        if col == "geometry":
-            continue
-        dtype = QVariant.String
-        if pd.api.types.is_numeric_dtype(grid[col]):
-            dtype = QVariant.Double
-        fields.append(QgsField(col, dtype))
-
-    mem_layer = QgsVectorLayer(f"Polygon?crs={crs.authid()}", "Building Density", "memory")
+    for field in grid_layer.fields():
+        # Generated grids already carry grid_id, which is written below
+        if field.name() not in added:
+            fields.append(QgsField(field.name(), QVariant.Double if field.isNumeric() else QVariant.String))
+    for name in added:
+        fields.append(QgsField(name, QVariant.Double))
+
+    mem_layer = QgsVectorLayer(f"Polygon?crs={grid_layer.crs().authid()}", "Building Density", "memory")
     mem_provider = mem_layer.dataProvider()
     mem_provider.addAttributes(fields)
     mem_layer.updateFields()
 
-    for _, row in grid.iterrows():
-        feat = QgsFeature()
-        feat.setFields(fields)
-        feat.setGeometry(QgsGeometry.fromWkt(row.geometry.wkt))
-        feat.setAttributes([row[col] for col in grid.columns if col != "geometry"])
-        mem_provider.addFeature(feat)
+    results = None
+    # One worker pool serves every block, rather than one per block
+    parallel = workers > 1 and cached is None and method not in ("raster", "overlay")
+    with worker_pool(workers) if parallel else nullcontext() as pool:
+        for minx, miny, maxx, maxy in blocks:
+            request = QgsFeatureRequest().setFilterRect(QgsRectangle(minx, miny, maxx, maxy))
+            grid = layer_to_geodataframe(grid_layer, request, with_fids=True)
+            if grid.empty:
+                continue
+
+            # Keep only the cells whose centre falls in this block
+            bounds = grid.geometry.bounds
+            cx = (bounds["minx"] + bounds["maxx"]) / 2
+            cy = (bounds["miny"] + bounds["maxy"]) / 2
+            grid = grid[(cx >= minx) & (cx < maxx) & (cy > miny) & (cy <= maxy)].copy()
+            if grid.empty:
+                continue
+
+            features = None
+            if cached is None:
+                cells_rect = QgsRectangle(*grid.total_bounds)
+                feature_request = QgsFeatureRequest().setFilterRect(to_features.transformBoundingBox(cells_rect))
+                features = layer_to_geodataframe(feature_layer, feature_request, attributes=False)
+                if grid.crs != features.crs:
+                    features = features.to_crs(grid.crs)
+
+            grid[CELL_POSITION] = [positions[fid] for fid in grid.index]
+            if "grid_id" not in grid.columns:
+                grid["grid_id"] = grid[CELL_POSITION]
+            grid = _add_coverage(grid.reset_index(drop=True), features, output_field, method, resolution,
+                                 workers, cached, metrics, pool)
+            results = _collect_results(grid, columns, len(positions), results)
+            write_geodataframe(mem_provider, grid, mem_layer.fields())
 
     mem_layer.updateExtents()
-    return mem_layer
+    return mem_layer, results
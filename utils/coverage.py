@@ -0,0 +1,733 @@
+import multiprocessing
+import multiprocessing.spawn
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+import shapely
+
+from .hex_grid import HexGrid
+from .regular_grid import RegularGrid
+
+# Available coverage backends; "overlay" is the original gpd.overlay path,
+# "auto" picks "regular" for regular grids, "strtree" otherwise, and "raster"
+# is the approximate rasterized mode
+BACKENDS = ("auto", "strtree", "regular", "raster", "overlay")
+DEFAULT_BACKEND = "auto"
+
+# Per-cell aggregates computed in the same pass as building_area:
+# buildings overlapping the cell, their mean and largest full footprint area,
+# and building outline length inside the cell per unit of cell area
+METRICS = ("building_count", "mean_footprint", "max_footprint", "perimeter_density")
+
+# Outline segments lying on a cell edge belong to the one cell found by
+# stepping off their midpoint in this direction (parallel to no square or hex
+# edge), so square cells own their left and top edges like half-open cells.
+# The step is EDGE_OFFSET times the cell size.
+EDGE_DIRECTION = (0.8, -0.6)
+EDGE_OFFSET = 1e-6
+
+# Upper bound on the sub-cell raster held in memory at once (in pixels)
+RASTER_MAX_PIXELS = 50_000_000
+
+
+def clean_geometries(geoms):
+    """
+    Drops missing/empty geometries and repairs invalid ones, like gpd.overlay does.
+
+    :param geoms: Array of shapely geometries
+    :return: Array of valid, non-empty geometries
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    geoms = geoms[~(shapely.is_missing(geoms) | shapely.is_empty(geoms))]
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms = geoms.copy()
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+    return geoms
+
+
+def candidate_pairs(cells, buildings):
+    """
+    Bulk-queries an STRtree of the cells for intersecting (building, cell) pairs.
+
+    Pairs are returned sorted by cell, then building, so per-cell sums are
+    always accumulated in the same order.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries
+    :return: Tuple (building_idx, cell_idx) of int arrays
+    """
+    tree = shapely.STRtree(cells)
+    building_idx, cell_idx = tree.query(buildings, predicate="intersects")
+    order = np.lexsort((building_idx, cell_idx))
+    return building_idx[order], cell_idx[order]
+
+
+def pair_areas(cells, buildings, building_idx, cell_idx):
+    """
+    Computes the clipped building area for each (building, cell) pair.
+
+    Buildings lying completely inside their cell keep their own area; only
+    the remaining pairs go through a vectorized intersection.
+
+    :return: Tuple (areas, inside) where inside flags buildings wholly
+        within the cell
+    """
+    pair_cells = cells[cell_idx]
+    pair_buildings = buildings[building_idx]
+
+    shapely.prepare(pair_cells)
+    inside = shapely.contains(pair_cells, pair_buildings)
+
+    areas = shapely.area(pair_buildings)
+    crossing = ~inside
+    if crossing.any():
+        clipped = shapely.intersection(pair_buildings[crossing], pair_cells[crossing])
+        areas[crossing] = shapely.area(clipped)
+    return areas, inside
+
+
+def aggregate_pairs(cells, buildings, building_idx, cell_idx, areas, inside, metrics=(), rectangular=False):
+    """
+    Reduces per-pair results to per-cell values in one pass.
+
+    :param cells: Array of grid cell polygons, or a RegularGrid / HexGrid
+        whose cells are addressed by row-major id
+    :param buildings: Array of building geometries
+    :param building_idx: Building of each pair (pairs sorted by cell)
+    :param cell_idx: Cell of each pair
+    :param areas: Clipped building area of each pair
+    :param inside: Whether the building lies wholly within the pair's cell
+    :param metrics: Extra aggregates to compute, from METRICS
+    :param rectangular: Cells are axis-aligned rectangles (enables clip_by_rect)
+        and pairs include every cell a building touches, so pairs flagged
+        inside never touch their cell's edges
+    :return: Dict of float arrays, one value per cell, always with building_area
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown coverage metrics {sorted(unknown)}. Choose from {METRICS}.")
+
+    n_cells = _cell_count(cells)
+    results = {"building_area": np.bincount(cell_idx, weights=areas, minlength=n_cells)}
+    if not metrics:
+        return results
+
+    # Pairs that only touch a cell edge do not count as overlapping
+    overlapping = areas > 0
+    counts = np.bincount(cell_idx[overlapping], minlength=n_cells).astype(float)
+    footprints = shapely.area(buildings)[building_idx[overlapping]]
+
+    if "building_count" in metrics:
+        results["building_count"] = counts
+    if "mean_footprint" in metrics:
+        totals = np.bincount(cell_idx[overlapping], weights=footprints, minlength=n_cells)
+        results["mean_footprint"] = np.divide(totals, counts, out=np.zeros(n_cells), where=counts > 0)
+    if "max_footprint" in metrics:
+        largest = np.zeros(n_cells)
+        np.maximum.at(largest, cell_idx[overlapping], footprints)
+        results["max_footprint"] = largest
+    if "perimeter_density" in metrics:
+        outlines = shapely.boundary(buildings)
+        lengths = shapely.length(outlines[building_idx])
+        crossing = ~inside
+        if rectangular:
+            # clip_by_rect leaves out segments on the cell edges
+            on_edge = crossing
+            if crossing.any():
+                lengths[crossing] = clipped_rect_measure(
+                    cells, outlines, building_idx[crossing], cell_idx[crossing], shapely.length)
+        else:
+            if crossing.any():
+                lengths[crossing] = shapely.length(
+                    shapely.intersection(outlines[building_idx[crossing]], _cell_geometries(cells, cell_idx[crossing])))
+            on_edge = crossing.copy()
+            if inside.any():
+                # Buildings inside a cell may still lie along its edges
+                inner_cells = _cell_geometries(cells, cell_idx[inside])
+                shapely.prepare(inner_cells)
+                on_edge[inside] = ~shapely.contains_properly(inner_cells, buildings[building_idx[inside]])
+        if on_edge.any():
+            owned, shared = edge_lengths(cells, outlines, building_idx[on_edge], cell_idx[on_edge])
+            lengths[on_edge] += owned if rectangular else owned - shared
+        cell_area = cells.cell_area if _is_implicit(cells) else shapely.area(cells)
+        results["perimeter_density"] = np.bincount(cell_idx, weights=lengths, minlength=n_cells) / cell_area
+    return results
+
+
+def edge_lengths(cells, outlines, geom_idx, cell_idx):
+    """
+    Measures the outline segments lying on the edges of their cell.
+
+    A segment on an edge shared by two cells is owned by exactly one of
+    them, the cell holding a point just off its midpoint in EDGE_DIRECTION,
+    so every backend counts it once whichever way the pairs were found.
+
+    :return: Tuple (owned, shared) of lengths per pair: the edge segments the
+        cell owns and all edge segments
+    """
+    polygons = _cell_geometries(cells, cell_idx)
+    shared = shapely.intersection(outlines[geom_idx], shapely.boundary(polygons))
+    # Flatten collections of points and (multi)lines down to single lines
+    parts, owner = shapely.get_parts(shared, return_index=True)
+    parts, nested = shapely.get_parts(parts, return_index=True)
+    owner = owner[nested]
+    lines = shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING
+    parts, owner = parts[lines], owner[lines]
+
+    coords, line_idx = shapely.get_coordinates(parts, return_index=True)
+    segment = line_idx[1:] == line_idx[:-1]
+    start, stop = coords[:-1][segment], coords[1:][segment]
+    pair = owner[line_idx[:-1][segment]]
+    length = np.hypot(*(stop - start).T)
+
+    step = np.sqrt(shapely.area(polygons))[pair] * EDGE_OFFSET
+    x = (start[:, 0] + stop[:, 0]) / 2 + step * EDGE_DIRECTION[0]
+    y = (start[:, 1] + stop[:, 1]) / 2 + step * EDGE_DIRECTION[1]
+    owned = shapely.contains_xy(polygons[pair], x, y)
+    return (np.bincount(pair, weights=length * owned, minlength=len(geom_idx)),
+            np.bincount(pair, weights=length, minlength=len(geom_idx)))
+
+
+def _is_implicit(cells):
+    return isinstance(cells, (RegularGrid, HexGrid))
+
+
+def _cell_count(cells):
+    return cells.n_cells if _is_implicit(cells) else len(cells)
+
+
+def _cell_geometries(cells, cell_idx):
+    return cells.cell_polygons(cell_idx) if _is_implicit(cells) else cells[cell_idx]
+
+
+def _empty_results(n_cells, metrics):
+    return {name: np.zeros(n_cells) for name in ("building_area",) + tuple(metrics)}
+
+
+def strtree_metrics(cells, buildings, metrics=()):
+    """
+    Per-cell building area (and optional METRICS) on arbitrary polygon cells.
+
+    Only the (building, cell) pairs returned by the STRtree are ever clipped,
+    and only their areas are kept; results are accumulated with np.bincount.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param metrics: Extra aggregates to compute, from METRICS
+    :return: Dict of float arrays, one value per cell
+    """
+    cells = np.asarray(cells, dtype=object)
+    buildings = clean_geometries(buildings)
+    if len(cells) == 0 or len(buildings) == 0:
+        return _empty_results(len(cells), metrics)
+
+    building_idx, cell_idx = candidate_pairs(cells, buildings)
+    areas, inside = pair_areas(cells, buildings, building_idx, cell_idx)
+    return aggregate_pairs(cells, buildings, building_idx, cell_idx, areas, inside, metrics)
+
+
+def building_area_strtree(cells, buildings):
+    """
+    Sums the building area falling inside each cell (STRtree engine).
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :return: Float array with one building area per cell
+    """
+    return strtree_metrics(cells, buildings)["building_area"]
+
+
+def regular_pairs(grid, row_idx, col_idx, buildings, closed=False):
+    """
+    Finds (building, cell) pairs on a regular grid by arithmetic on the bounds.
+
+    :param grid: RegularGrid describing the cell layout
+    :param row_idx: Row of each grid cell (feature order), or None when every
+        cell exists and is addressed by its row-major id
+    :param col_idx: Column of each grid cell (feature order), or None
+    :param buildings: Array of building geometries
+    :param closed: Also pair buildings with the cells they only touch, so
+        buildings along a cell edge are never flagged inside
+    :return: Tuple (building_idx, cell_idx, inside) where inside flags pairs
+        whose building lies wholly within a single cell
+    """
+    if row_idx is None:
+        # Implicit grid: no lookup table, ids are computed
+        def lookup(rows, cols):
+            return rows * grid.cols + cols
+    else:
+        table = np.full((grid.rows, grid.cols), -1, dtype=np.int64)
+        table[row_idx, col_idx] = np.arange(len(row_idx))
+
+        def lookup(rows, cols):
+            return table[rows, cols]
+
+    row0, row1, col0, col1 = grid.cell_ranges(shapely.bounds(buildings), closed)
+    inside = (row0 == row1) & (col0 == col1) & (row0 >= 0) & (row0 < grid.rows) & (col0 >= 0) & (col0 < grid.cols)
+
+    # Expand the remaining buildings into every cell their bounds overlap
+    rest = np.flatnonzero(~inside)
+    r0 = np.clip(row0[rest], 0, grid.rows - 1)
+    r1 = np.clip(row1[rest], 0, grid.rows - 1)
+    c0 = np.clip(col0[rest], 0, grid.cols - 1)
+    c1 = np.clip(col1[rest], 0, grid.cols - 1)
+    overlaps = (row1[rest] >= 0) & (row0[rest] < grid.rows) & (col1[rest] >= 0) & (col0[rest] < grid.cols)
+    n_cols = np.where(overlaps, c1 - c0 + 1, 0)
+    n_pairs = np.where(overlaps, (r1 - r0 + 1) * n_cols, 0)
+
+    owner = np.repeat(np.arange(len(rest)), n_pairs)
+    offset = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+    rows = r0[owner] + offset // n_cols[owner]
+    cols = c0[owner] + offset % n_cols[owner]
+
+    single = np.flatnonzero(inside)
+    building_idx = np.concatenate([single, rest[owner]])
+    cell_idx = np.concatenate([lookup(row0[single], col0[single]), lookup(rows, cols)])
+    inside_pair = np.concatenate([np.ones(len(single), dtype=bool), np.zeros(len(owner), dtype=bool)])
+
+    keep = cell_idx >= 0
+    building_idx, cell_idx, inside_pair = building_idx[keep], cell_idx[keep], inside_pair[keep]
+    order = np.lexsort((building_idx, cell_idx))
+    return building_idx[order], cell_idx[order], inside_pair[order]
+
+
+def clipped_rect_measure(cells, geoms, geom_idx, cell_idx, measure=shapely.area):
+    """
+    Clips geometries against their (rectangular) cells with clip_by_rect and
+    measures the result (area by default).
+
+    Pairs must be sorted by cell; each cell is clipped in one vectorized call.
+    cells may also be a RegularGrid, whose cell bounds are computed on demand.
+    """
+    values = np.empty(len(geom_idx))
+    starts = np.flatnonzero(np.r_[True, cell_idx[1:] != cell_idx[:-1]])
+    stops = np.r_[starts[1:], len(cell_idx)]
+    if isinstance(cells, RegularGrid):
+        cell_bounds = cells.cell_bounds(cell_idx[starts])
+    else:
+        cell_bounds = shapely.bounds(cells[cell_idx[starts]])
+    for bounds, start, stop in zip(cell_bounds, starts, stops):
+        clipped = shapely.clip_by_rect(geoms[geom_idx[start:stop]], *bounds)
+        values[start:stop] = measure(clipped)
+    return values
+
+
+def regular_metrics(cells, buildings, layout=None, metrics=()):
+    """
+    Per-cell building area (and optional METRICS) on a regular axis-aligned grid.
+
+    Buildings wholly inside one cell are added directly; only buildings that
+    cross a cell boundary are clipped, against the rectangles they overlap.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param layout: Optional (grid, row_idx, col_idx) from RegularGrid.detect
+    :param metrics: Extra aggregates to compute, from METRICS
+    :return: Dict of float arrays, one value per cell
+    """
+    cells = np.asarray(cells, dtype=object)
+    if layout is None:
+        layout = RegularGrid.detect(cells)
+    if layout is None:
+        raise ValueError("Grid is not a regular axis-aligned grid.")
+
+    buildings = clean_geometries(buildings)
+    if len(cells) == 0 or len(buildings) == 0:
+        return _empty_results(len(cells), metrics)
+
+    # Outline length needs every cell a building touches (see edge_lengths)
+    building_idx, cell_idx, inside = regular_pairs(*layout, buildings, "perimeter_density" in metrics)
+    areas = shapely.area(buildings[building_idx])
+    crossing = ~inside
+    if crossing.any():
+        areas[crossing] = clipped_rect_measure(cells, buildings, building_idx[crossing], cell_idx[crossing])
+    return aggregate_pairs(cells, buildings, building_idx, cell_idx, areas, inside, metrics, rectangular=True)
+
+
+def hex_pairs(grid, buildings):
+    """
+    Finds (building, cell) pairs on a hex grid by arithmetic on the bounds.
+
+    A building whose bounding box corners all fall in the same hexagon is
+    wholly inside that (convex) cell; the others are paired with every
+    hexagon their bounds overlap.
+
+    :param grid: HexGrid
+    :param buildings: Array of building geometries
+    :return: Tuple (building_idx, cell_idx, inside), sorted by cell
+    """
+    # Padded a hair, so buildings along a hexagon edge are paired with both sides
+    pad = grid.size * EDGE_OFFSET
+    bounds = shapely.bounds(buildings) + np.array([-pad, -pad, pad, pad])
+    home = grid.cell_ids_at(bounds[:, 0], bounds[:, 1])
+    inside = home >= 0
+    for x, y in ((2, 1), (0, 3), (2, 3)):
+        inside &= grid.cell_ids_at(bounds[:, x], bounds[:, y]) == home
+
+    # The remaining buildings are paired with every hexagon their bounds overlap
+    rest = np.flatnonzero(~inside)
+    pair_owner, pair_cells = grid.cells_in_bounds(bounds[rest])
+
+    single = np.flatnonzero(inside)
+    building_idx = np.concatenate([single, rest[pair_owner]])
+    cell_idx = np.concatenate([home[single], pair_cells])
+    inside_pair = np.concatenate([np.ones(len(single), dtype=bool), np.zeros(len(pair_owner), dtype=bool)])
+    order = np.lexsort((building_idx, cell_idx))
+    return building_idx[order], cell_idx[order], inside_pair[order]
+
+
+def hex_metrics(grid, buildings, metrics=()):
+    """
+    Per-cell building area (and optional METRICS) on a hex grid.
+
+    Pairs come from hex_pairs; only buildings crossing a hexagon edge are
+    intersected with the (on demand built) hexagons they overlap.
+
+    :param grid: HexGrid
+    :param buildings: Array of building geometries (same CRS as the grid)
+    :param metrics: Extra aggregates to compute, from METRICS
+    :return: Dict of dense float arrays indexed by cell id
+    """
+    buildings = clean_geometries(buildings)
+    if len(buildings) == 0:
+        return _empty_results(grid.n_cells, metrics)
+
+    building_idx, cell_idx, inside = hex_pairs(grid, buildings)
+    crossing = np.flatnonzero(~inside)
+    if len(crossing):
+        cells, local_idx = np.unique(cell_idx[crossing], return_inverse=True)
+        hexagons = grid.cell_polygons(cells)
+        shapely.prepare(hexagons)
+        # Bounds overlap only; drop the pairs that do not actually intersect
+        touching = shapely.intersects(hexagons[local_idx.ravel()], buildings[building_idx[crossing]])
+        keep = np.ones(len(building_idx), dtype=bool)
+        keep[crossing[~touching]] = False
+        building_idx, cell_idx, inside = building_idx[keep], cell_idx[keep], inside[keep]
+        crossing = np.flatnonzero(~inside)
+        local_idx = np.searchsorted(cells, cell_idx[crossing])
+
+    areas = shapely.area(buildings[building_idx])
+    if len(crossing):
+        areas[crossing], inside[crossing] = pair_areas(hexagons, buildings, building_idx[crossing], local_idx)
+    return aggregate_pairs(grid, buildings, building_idx, cell_idx, areas, inside, metrics)
+
+
+def grid_metrics(grid, buildings, metrics=()):
+    """
+    Per-cell building area (and optional METRICS) on an implicit grid.
+
+    Same arithmetic as regular_metrics, but no cell polygons exist: pairs
+    are addressed by row-major cell id and only the cells crossed by a
+    building outline get their bounds computed. Hex grids go through
+    hex_metrics.
+
+    :param grid: RegularGrid or HexGrid
+    :param buildings: Array of building geometries (same CRS as the grid)
+    :param metrics: Extra aggregates to compute, from METRICS
+    :return: Dict of dense float arrays indexed by cell id (row * cols + col);
+        reshape to (grid.rows, grid.cols) for a 2D view
+    """
+    if isinstance(grid, HexGrid):
+        return hex_metrics(grid, buildings, metrics)
+    buildings = clean_geometries(buildings)
+    if len(buildings) == 0:
+        return _empty_results(grid.n_cells, metrics)
+
+    building_idx, cell_idx, inside = regular_pairs(grid, None, None, buildings, "perimeter_density" in metrics)
+    areas = shapely.area(buildings[building_idx])
+    crossing = ~inside
+    if crossing.any():
+        areas[crossing] = clipped_rect_measure(grid, buildings, building_idx[crossing], cell_idx[crossing])
+    return aggregate_pairs(grid, buildings, building_idx, cell_idx, areas, inside, metrics, rectangular=True)
+
+
+def building_area_regular(cells, buildings, layout=None):
+    """
+    Sums the building area inside each cell of a regular grid (fast path).
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param layout: Optional (grid, row_idx, col_idx) from RegularGrid.detect
+    :return: Float array with one building area per cell
+    """
+    return regular_metrics(cells, buildings, layout)["building_area"]
+
+
+def coverage_metrics(cells, buildings, method=DEFAULT_BACKEND, metrics=(), workers=1, pool=None):
+    """
+    Computes per-cell building area and optional METRICS in a single pass.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param method: "auto", "strtree" or "regular"
+    :param metrics: Extra aggregates to compute, from METRICS
+    :param workers: Number of worker processes (1 runs in this process)
+    :param pool: Optional pool from worker_pool, reused instead of starting one
+    :return: Dict of float arrays (building_area plus each metric), one value per cell
+    """
+    layout = None if method == "strtree" else RegularGrid.detect(cells)
+    if layout is None and method == "regular":
+        raise ValueError("Grid is not a regular axis-aligned grid.")
+
+    if workers and workers > 1:
+        return parallel_metrics(cells, buildings, layout, workers, metrics=metrics, pool=pool)
+    if layout is not None:
+        return regular_metrics(cells, buildings, layout, metrics)
+    return strtree_metrics(cells, buildings, metrics)
+
+
+def building_area(cells, buildings, method=DEFAULT_BACKEND, workers=1):
+    """
+    Sums the building area inside each cell with the requested backend.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param method: "auto", "strtree" or "regular"
+    :param workers: Number of worker processes (1 runs in this process)
+    :return: Float array with one building area per cell
+    """
+    return coverage_metrics(cells, buildings, method, workers=workers)["building_area"]
+
+
+def building_area_raster(cells, buildings, resolution=1.0, layout=None, max_pixels=RASTER_MAX_PIXELS):
+    """
+    Approximates the building area inside each cell of a regular grid.
+
+    Buildings are burnt (pixel centre rule) into a NumPy raster aligned to the
+    grid with GDAL, one band of grid rows at a time, and the pixels are
+    block-summed per cell. The resolution is adjusted so each cell holds a
+    whole number of pixels. Overlapping footprints are counted once.
+
+    Only pixels crossed by a building outline can be partly covered, so the
+    error of a cell is at most the area of those pixels. Outlines are burnt
+    into a second band with ALL_TOUCHED, which also catches footprints
+    smaller than a pixel, and alongside the areas that bound is returned.
+    Pixels never straddle cells or bands, so the bound holds across seams.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param resolution: Target pixel size in map units
+    :param layout: Optional (grid, row_idx, col_idx) from RegularGrid.detect
+    :param max_pixels: Maximum raster size processed at once
+    :return: Tuple (areas, error_bounds) of float arrays, one value per cell
+    """
+    from osgeo import gdal, ogr
+
+    cells = np.asarray(cells, dtype=object)
+    if layout is None:
+        layout = RegularGrid.detect(cells)
+    if layout is None:
+        raise ValueError("Approximate coverage requires a regular axis-aligned grid.")
+    if resolution <= 0:
+        raise ValueError("Raster resolution must be positive.")
+    grid, row_idx, col_idx = layout
+
+    buildings = clean_geometries(buildings)
+    if len(cells) == 0 or len(buildings) == 0:
+        return np.zeros(len(cells)), np.zeros(len(cells))
+
+    kx = max(1, int(round(grid.cell_width / resolution)))
+    ky = max(1, int(round(grid.cell_height / resolution)))
+    pixel_width = grid.cell_width / kx
+    pixel_height = grid.cell_height / ky
+
+    # Buildings and their outlines go into OGR memory layers once; bands use
+    # a spatial filter
+    source = ogr.GetDriverByName("Memory").CreateDataSource("")
+    layers = []
+    for name, geoms in (("buildings", buildings), ("outlines", shapely.boundary(buildings))):
+        layer = source.CreateLayer(name, geom_type=ogr.wkbUnknown)
+        definition = layer.GetLayerDefn()
+        for wkb in shapely.to_wkb(geoms):
+            feature = ogr.Feature(definition)
+            feature.SetGeometry(ogr.CreateGeometryFromWkb(wkb))
+            layer.CreateFeature(feature)
+        layers.append(layer)
+    layer, outlines = layers
+
+    covered = np.zeros((grid.rows, grid.cols))
+    crossed = np.zeros((grid.rows, grid.cols))
+    band_rows = max(1, max_pixels // (grid.cols * kx * ky))
+    driver = gdal.GetDriverByName("MEM")
+
+    for row in range(0, grid.rows, band_rows):
+        n_rows = min(band_rows, grid.rows - row)
+        top = grid.y_max - row * grid.cell_height
+        for band_layer in layers:
+            band_layer.SetSpatialFilterRect(grid.x_min, top - n_rows * grid.cell_height, grid.x_max, top)
+
+        raster = driver.Create("", grid.cols * kx, n_rows * ky, 2, gdal.GDT_Byte)
+        raster.SetGeoTransform((grid.x_min, pixel_width, 0.0, top, 0.0, -pixel_height))
+        gdal.RasterizeLayer(raster, [1], layer, burn_values=[1])
+        gdal.RasterizeLayer(raster, [2], outlines, burn_values=[1], options=["ALL_TOUCHED=TRUE"])
+        pixels = raster.GetRasterBand(1).ReadAsArray().astype(bool)
+        edges = raster.GetRasterBand(2).ReadAsArray().astype(bool)
+        raster = None
+
+        covered[row:row + n_rows] = pixels.reshape(n_rows, ky, grid.cols, kx).sum(axis=(1, 3))
+        crossed[row:row + n_rows] = edges.reshape(n_rows, ky, grid.cols, kx).sum(axis=(1, 3))
+
+    for band_layer in layers:
+        band_layer.SetSpatialFilter(None)
+    pixel_area = pixel_width * pixel_height
+    return covered[row_idx, col_idx] * pixel_area, crossed[row_idx, col_idx] * pixel_area
+
+
+# Rough in-memory cost of one feature (shapely object, WKB copy, pair arrays)
+# used to size blocks in tiled mode
+BYTES_PER_FEATURE = 4096
+BYTES_PER_CELL = 2048
+
+
+def split_extent(bounds, memory_budget_mb, n_cells, n_features):
+    """
+    Splits an extent into blocks small enough to process within a memory budget.
+
+    Cells and features are assumed to be spread evenly over the extent.
+
+    :param bounds: Tuple (minx, miny, maxx, maxy)
+    :param memory_budget_mb: Memory budget per block, in megabytes
+    :param n_cells: Number of grid cells in the extent
+    :param n_features: Number of features in the extent
+    :return: List of (minx, miny, maxx, maxy) blocks, row by row from the top
+    """
+    minx, miny, maxx, maxy = bounds
+    estimated = n_cells * BYTES_PER_CELL + n_features * BYTES_PER_FEATURE
+    n_blocks = max(1, int(np.ceil(estimated / (memory_budget_mb * 1024 * 1024))))
+
+    # Roughly square blocks
+    width, height = maxx - minx, maxy - miny
+    n_cols = max(1, int(np.ceil(np.sqrt(n_blocks * width / height)))) if height > 0 else n_blocks
+    n_rows = max(1, int(np.ceil(n_blocks / n_cols)))
+
+    xs = np.linspace(minx, maxx, n_cols + 1).tolist()
+    ys = np.linspace(maxy, miny, n_rows + 1).tolist()
+    return [(xs[c], ys[r + 1], xs[c + 1], ys[r]) for r in range(n_rows) for c in range(n_cols)]
+
+
+def _python_executable():
+    """
+    Returns a Python interpreter for worker processes.
+
+    Inside QGIS sys.executable is usually the QGIS binary, not Python.
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    names = ["pythonw.exe", "python.exe"] if sys.platform == "win32" else ["python3", "python"]
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")):
+        for name in names:
+            candidate = os.path.join(folder, name)
+            if os.path.exists(candidate):
+                return candidate
+    return sys.executable
+
+
+@contextmanager
+def worker_pool(workers):
+    """
+    Starts a pool of spawned worker processes for parallel_metrics.
+
+    The interpreter used to spawn workers is a process-wide setting, so the
+    previous one is restored once the pool has shut down.
+
+    :param workers: Number of worker processes
+    """
+    context = multiprocessing.get_context("spawn")
+    previous = multiprocessing.spawn.get_executable()
+    context.set_executable(_python_executable())
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            yield pool
+    finally:
+        context.set_executable(previous)
+
+
+def partition_cells(cells, n_chunks):
+    """
+    Splits cells into spatially coherent chunks (vertical strips cut into blocks).
+
+    :return: List of int arrays of cell indices, each sorted ascending
+    """
+    minx, miny, maxx, maxy = shapely.bounds(cells).T
+    cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+
+    n_strips = max(1, int(np.ceil(np.sqrt(n_chunks))))
+    per_strip = max(1, int(np.ceil(n_chunks / n_strips)))
+    chunks = []
+    for strip in np.array_split(np.argsort(cx, kind="stable"), n_strips):
+        for chunk in np.array_split(strip[np.argsort(cy[strip], kind="stable")], per_strip):
+            if len(chunk):
+                chunks.append(np.sort(chunk))
+    return chunks
+
+
+def _chunk_metrics(cell_wkb, building_wkb, layout, metrics):
+    """
+    Worker entry point: per-cell results for one chunk, from WKB inputs.
+
+    :param layout: None, or (grid parameters, row_idx, col_idx) for the chunk
+    """
+    cells = shapely.from_wkb(cell_wkb)
+    buildings = shapely.from_wkb(building_wkb)
+    if layout is None:
+        return strtree_metrics(cells, buildings, metrics)
+    params, row_idx, col_idx = layout
+    return regular_metrics(cells, buildings, (RegularGrid(*params), row_idx, col_idx), metrics)
+
+
+def parallel_metrics(cells, buildings, layout=None, workers=2, chunks_per_worker=4, metrics=(), pool=None):
+    """
+    Computes per-cell building area (and optional METRICS) in a pool of
+    worker processes.
+
+    The grid is split into spatially coherent chunks; each worker receives a
+    chunk's cells plus the buildings overlapping the chunk and sends back
+    only its per-cell arrays. Buildings keep their original order within a
+    chunk and the regular layout is the global one, so every cell sums the
+    same values in the same order as the serial path and results match it
+    exactly.
+
+    :param cells: Array of grid cell polygons
+    :param buildings: Array of building geometries (same CRS as cells)
+    :param layout: Optional (grid, row_idx, col_idx) to use the regular path
+    :param workers: Number of worker processes
+    :param chunks_per_worker: Chunks per worker, for load balancing
+    :param metrics: Extra aggregates to compute, from METRICS
+    :param pool: Optional pool from worker_pool; without one a pool is
+        started for this call only
+    :return: Dict of float arrays, one value per cell
+    """
+    cells = np.asarray(cells, dtype=object)
+    buildings = clean_geometries(buildings)
+    results = _empty_results(len(cells), metrics)
+    if len(cells) == 0 or len(buildings) == 0:
+        return results
+    if pool is None:
+        with worker_pool(workers) as pool:
+            return parallel_metrics(cells, buildings, layout, workers, chunks_per_worker, metrics, pool)
+
+    tree = shapely.STRtree(buildings)
+    cell_wkb = shapely.to_wkb(cells)
+    building_wkb = shapely.to_wkb(buildings)
+
+    jobs = {}
+    for chunk in partition_cells(cells, workers * chunks_per_worker):
+        # STRtree bounding box query returns ascending building indices
+        chunk_box = shapely.box(*shapely.total_bounds(cells[chunk]))
+        nearby = np.sort(tree.query(chunk_box))
+        chunk_layout = None
+        if layout is not None:
+            grid, row_idx, col_idx = layout
+            params = (grid.x_min, grid.y_max, grid.cell_width, grid.cell_height, grid.rows, grid.cols)
+            chunk_layout = (params, row_idx[chunk], col_idx[chunk])
+        job = pool.submit(_chunk_metrics, cell_wkb[chunk], building_wkb[nearby], chunk_layout, tuple(metrics))
+        jobs[job] = chunk
+
+    for job in as_completed(jobs):
+        for name, values in job.result().items():
+            results[name][jobs[job]] = values
+    return results
@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+from qgis.core import QgsFeatureRequest, QgsProviderRegistry
+
+from .disk_cache import DiskCache, default_cache_dir, fingerprint
+
+# Size cap of the on-disk coverage cache
+COVERAGE_CACHE_MAX_MB = 512
+
+
+def get_coverage_cache():
+    """
+    Returns the DiskCache holding per-cell coverage results.
+    """
+    return DiskCache(default_cache_dir("coverage"), COVERAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def clear_coverage_cache():
+    get_coverage_cache().clear()
+
+
+def _geometry_hash(layer):
+    """
+    Hashes every geometry of a layer (WKB), for sources without a file stamp.
+    """
+    digest = hashlib.sha256()
+    request = QgsFeatureRequest().setSubsetOfAttributes([])
+    for feature in layer.getFeatures(request):
+        digest.update(str(feature.id()).encode("ascii"))
+        digest.update(bytes(feature.geometry().asWkb()))
+    return digest.hexdigest()
+
+
+def layer_fingerprint(layer):
+    """
+    Describes a layer's content: source, feature count, extent, CRS and either
+    the source file's modification stamp or a hash of all geometries.
+    """
+    provider = layer.providerType()
+    extent = layer.extent()
+    parts = [provider, layer.publicSource(), layer.subsetString(), layer.crs().authid(), layer.featureCount(),
+             (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())]
+
+    path = QgsProviderRegistry.instance().decodeUri(provider, layer.source()).get("path")
+    if path and os.path.isfile(path) and not layer.isModified():
+        stat = os.stat(path)
+        parts.append(("file", stat.st_mtime_ns, stat.st_size))
+    else:
+        # Memory layers and layers with pending edits have no reliable stamp
+        parts.append(("geometry", _geometry_hash(layer)))
+    return parts
+
+
+def coverage_key(grid_layer, feature_layer, *params):
+    """
+    Content-addressed cache key for a coverage run.
+    """
+    return fingerprint(layer_fingerprint(grid_layer), layer_fingerprint(feature_layer), *params)
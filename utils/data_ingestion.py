@@ -1,10 +1,13 @@
 import os
 import tempfile
-import geopandas as gpd
-import pandas as pd
-import requests
-from shapely.geometry import shape, box
-from qgis.core import QgsVectorLayer, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+
+from shapely.geometry import box
+from qgis.core import QgsFields, QgsVectorLayer
+from .layer_conversion import create_vector_file, write_geodataframe
+from .ms_index import extent_to_wgs84
+from .reprojection import clip_to_aoi
+from .sources import MicrosoftBuildings
+from .tile_download import DOWNLOAD_WORKERS
 
 try:
     import mercantile
@@ -19,73 +22,87 @@ except ImportError:
     raise
 
 
-def download_ms_buildings_from_extent(extent, crs="EPSG:4326"):
+def plan_buildings(source, extent, crs="EPSG:4326"):
     """
-    Downloads Microsoft building footprints for the given extent (xmin, ymin, xmax, ymax).
-    
+    Lists what a source would fetch for an extent, without downloading.
+
+    :param source: BuildingSource (see sources.get_source)
+    :param extent: Tuple (minx, miny, maxx, maxy)
+    :param crs: Coordinate Reference System of input extent
+    :return: List of work items (e.g. PlannedTile for Microsoft Buildings)
+    """
+    return source.plan(extent_to_wgs84(extent, crs))
+
+
+def download_buildings(source, extent, crs="EPSG:4326", workers=DOWNLOAD_WORKERS, output_path=None, plan=None):
+    """
+    Downloads building footprints from a source for the given extent (xmin, ymin, xmax, ymax).
+
+    :param source: BuildingSource (see sources.get_source)
     :param extent: Tuple (minx, miny, maxx, maxy)
     :param crs: Coordinate Reference System of input extent (defaults to EPSG:4326)
-    :return: QgsVectorLayer loaded into memory
+    :param workers: Number of items fetched at the same time
+    :param output_path: GeoPackage (or .fgb) to write to, a temporary
+        GeoPackage by default
+    :param plan: Items to fetch as returned by plan_buildings (computed if None)
+    :return: QgsVectorLayer backed by the output file
     """
 
-    print(f"[INFO] Downloading MS buildings for {extent} ({crs})")
-
-    # Convert extent to WGS84 (EPSG:4326) for tile lookup
-    original_crs = QgsCoordinateReferenceSystem(crs)
-    wgs84_crs = QgsCoordinateReferenceSystem("EPSG:4326")
-    transform = QgsCoordinateTransform(original_crs, wgs84_crs, QgsProject.instance())
-
-    # Build bounding box polygon and transform
-    minx, miny, maxx, maxy = extent
-    rect_geom = box(minx, miny, maxx, maxy)
-    gdf_rect = gpd.GeoDataFrame(geometry=[rect_geom], crs=crs)
-    gdf_rect_wgs84 = gdf_rect.to_crs("EPSG:4326")
-    bounds = gdf_rect_wgs84.total_bounds  # minx, miny, maxx, maxy in WGS84
-
-
-    # Get Microsoft index
-    index_url = "https://minedbuildings.z5.web.core.windows.net/global-buildings/dataset-links.csv"
-    df_index = pd.read_csv(index_url, dtype=str)
-    df_index['QuadKey'] = df_index['QuadKey'].astype(str)
-
-    # Determine tiles (zoom level 9 for performance)
-    minx4326, miny4326, maxx4326, maxy4326 = bounds
-    quad_keys = set()
-    for tile in list(mercantile.tiles(minx4326, miny4326, maxx4326, maxy4326, zooms=9)):
-        quad_keys.add(mercantile.quadkey(tile))
-    quad_keys = list(quad_keys)
-
-    # Download + filter each matching tile
-    buildings_gdf = gpd.GeoDataFrame()
-    for qk in quad_keys:
-        row = df_index[df_index['QuadKey'] == qk]
-        if row.empty:
+    print(f"[INFO] Downloading {source.name} for {extent} ({crs})")
+
+    # AOI as a densified EPSG:4326 polygon (follows reprojected edges)
+    rect_geom = box(*extent)
+    aoi = extent_to_wgs84(extent, crs)
+
+    if plan is None:
+        plan = source.plan(aoi)
+    print(f"[INFO] Download plan: {source.describe(plan)}")
+
+    # Each batch's buildings are appended to an indexed file as they arrive
+    if output_path is None:
+        output_path = os.path.join(tempfile.mkdtemp(prefix="urbanmatrix_"), "buildings.gpkg")
+    fields = QgsFields()
+    writer = create_vector_file(output_path, "buildings", fields, "MultiPolygon", crs)
+    written = 0
+
+    failed = []
+    for item, gdf, error in source.batches(plan, aoi, workers):
+        if error is not None:
+            print(f"[ERROR] Could not fetch {item}: {error}")
+            failed.append(str(item))
             continue
-        url = row.iloc[0]["Url"]
-        try:
-            print(f"[INFO] Fetching {url}")
-            #r = requests.get(url)
-            #r.raise_for_status()
-            df = pd.read_json(url, lines=True)#(r.content, lines=True)
-            df["geometry"] = df["geometry"].apply(shape)
-            gdf = gpd.GeoDataFrame(df, crs="EPSG:4326")
-
-            # Reproject to original CRS for intersection
-            gdf = gdf.to_crs(crs)
-            gdf = gdf[gdf.geometry.intersects(rect_geom)]
-            buildings_gdf = pd.concat([buildings_gdf, gdf], ignore_index=True)
-            buildings_gdf = buildings_gdf.drop(['properties'], axis=1)
-
-        except Exception as e:
-            print(f"[ERROR] Could not download {qk}: {e}")
-
-    if buildings_gdf.empty:
+        written += write_geodataframe(writer, clip_to_aoi(gdf, crs, aoi, rect_geom), fields, multi=True)
+
+    if failed:
+        print(f"[WARN] {len(failed)} items could not be fetched: {', '.join(sorted(failed))}")
+
+    # Closing the writer flushes the file and its spatial index
+    del writer
+
+    if written == 0:
         print("[WARN] No buildings found.")
         return None
 
-    # Save to file and return as QgsVectorLayer
-    out_path = os.path.join(tempfile.gettempdir(), "ms_buildings.geojson")
-    buildings_gdf.to_file(out_path, driver="GeoJSON")
-
-    layer = QgsVectorLayer(out_path, "Microsoft Buildings", "ogr")
+    print(f"[INFO] Wrote {written} buildings to {output_path}")
+    layer = QgsVectorLayer(f"{output_path}|layername=buildings", source.name, "ogr")
     return layer if layer.isValid() else None
+
+
+def plan_ms_buildings(extent, crs="EPSG:4326"):
+    """
+    Lists the Microsoft building files needed for an extent, without downloading.
+
+    :return: List of PlannedTile (quadkey, url, size in bytes, location)
+    """
+    return plan_buildings(MicrosoftBuildings(), extent, crs)
+
+
+def download_ms_buildings_from_extent(extent, crs="EPSG:4326", use_cache=True, workers=DOWNLOAD_WORKERS,
+                                      output_path=None, plan=None):
+    """
+    Downloads Microsoft building footprints for the given extent (xmin, ymin, xmax, ymax).
+
+    :param use_cache: Serve tiles from (and save them to) the local tile store
+    :return: QgsVectorLayer backed by the output file
+    """
+    return download_buildings(MicrosoftBuildings(use_cache=use_cache), extent, crs, workers, output_path, plan)
@@ -0,0 +1,137 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+
+def default_cache_dir(*parts):
+    """
+    Returns (and creates) the per-user UrbanMatrix cache directory.
+
+    It does not depend on the QGIS profile, so the plugin and command-line
+    tools share it. Set URBANMATRIX_CACHE_DIR to override the location.
+    """
+    root = os.environ.get("URBANMATRIX_CACHE_DIR")
+    if not root:
+        if sys.platform == "win32":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "UrbanMatrix")
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def fingerprint(*parts):
+    """
+    Hashes any number of string-convertible parts into a hex key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed store of NumPy arrays on disk with size-based LRU eviction.
+
+    Each entry is an .npz file named by its key, with the SHA-256 of the file
+    stored alongside and verified on every read; corrupt entries are dropped.
+    A hit refreshes the entry's modification time, which drives eviction.
+    """
+
+    def __init__(self, directory, max_bytes, compress=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """
+        Returns the arrays stored under key, or None on a miss or failed check.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".sha256", "r") as f:
+                expected = f.read().strip()
+        except OSError:
+            return None
+
+        if hashlib.sha256(data).hexdigest() != expected:
+            print(f"[WARN] Dropping corrupt cache entry {key}")
+            self.remove(key)
+            return None
+
+        os.utime(path)
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def put(self, key, arrays):
+        """
+        Stores a dict of arrays under key, then evicts old entries if needed.
+        """
+        buffer = io.BytesIO()
+        (np.savez_compressed if self.compress else np.savez)(buffer, **arrays)
+        data = buffer.getvalue()
+
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with open(path + ".sha256", "w") as f:
+            f.write(hashlib.sha256(data).hexdigest())
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def remove(self, key):
+        for path in (self._path(key), self._path(key) + ".sha256"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def entries(self):
+        """
+        Returns (mtime, size, key) for every entry, least recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name[:-len(".npz")]))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+
+    def clear(self):
+        for _, _, key in self.entries():
+            self.remove(key)
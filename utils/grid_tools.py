@@ -1,34 +1,151 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
 from qgis.core import (
     QgsProject,
-    QgsCoordinateReferenceSystem
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsVectorLayer
 )
+from qgis.PyQt.QtCore import QVariant
 from qgis.utils import iface
-import processing
+from .layer_conversion import WRITE_BATCH_SIZE, write_geodataframe
+from .hex_grid import HexGrid
+from .raster_footprint import valid_cell_mask
+from .regular_grid import RegularGrid
 from .styling import style_grid
 
 
-def create_grid_from_raster(raster_layer, cell_size, grid_name="UrbanMatrix_Grid"):
+def grid_fields(values=None):
+    """
+    Attribute fields of generated grid layers, plus one per extra value array
+    (Double for numbers, String otherwise).
+    """
+    fields = QgsFields()
+    fields.append(QgsField("grid_id", QVariant.LongLong))
+    fields.append(QgsField("row", QVariant.Int))
+    fields.append(QgsField("col", QVariant.Int))
+    for name in ("left", "top", "right", "bottom"):
+        fields.append(QgsField(name, QVariant.Double))
+    for name, array in (values or {}).items():
+        fields.append(QgsField(name, QVariant.Double if np.asarray(array).dtype.kind in "biuf" else QVariant.String))
+    return fields
+
+
+def grid_to_layer(grid, crs_authid, layer_name="UrbanMatrix_Grid", batch_size=WRITE_BATCH_SIZE, values=None,
+                  cell_ids=None):
+    """
+    Writes the cells of a RegularGrid or HexGrid into a new memory layer.
+
+    Cells are generated batch by batch with NumPy and shapely, so only one
+    batch of geometries exists at a time. Features are written in row-major
+    order (top row first) with grid_id = row * cols + col, so when every
+    cell is written grid_id also equals the feature's position in the layer.
+
+    :param grid: RegularGrid or HexGrid to write
+    :param crs_authid: Authority id of the layer CRS
+    :param layer_name: Name of the memory layer
+    :param batch_size: Number of cells per addFeatures call
+    :param values: Optional dict of per-cell arrays indexed by cell id,
+        written as additional fields
+    :param cell_ids: Optional sorted subset of cell ids to write
+    :return: QgsVectorLayer
+    """
+    values = values or {}
+    grid_layer = QgsVectorLayer(f"Polygon?crs={crs_authid}", layer_name, "memory")
+    provider = grid_layer.dataProvider()
+    provider.addAttributes(grid_fields(values))
+    grid_layer.updateFields()
+
+    fields = grid_layer.fields()
+    n_written = grid.n_cells if cell_ids is None else len(cell_ids)
+    for start in range(0, n_written, batch_size):
+        stop = min(start + batch_size, n_written)
+        ids = np.arange(start, stop, dtype=np.int64) if cell_ids is None else np.asarray(cell_ids[start:stop])
+        row, col = grid.cell_index(ids)
+        bounds = grid.cell_bounds(ids)
+        cells = gpd.GeoDataFrame({
+            "grid_id": ids, "row": row, "col": col,
+            "left": bounds[:, 0], "top": bounds[:, 3], "right": bounds[:, 2], "bottom": bounds[:, 1],
+            **{name: np.asarray(array)[ids] for name, array in values.items()},
+        }, geometry=grid.cell_polygons(ids))
+        write_geodataframe(provider, cells, fields, batch_size)
+
+    grid_layer.updateExtents()
+    # Lets later steps recover the grid geometry without reading the features
+    grid_layer.setCustomProperty("urbanmatrix/grid", json.dumps(grid.to_dict()))
+    return grid_layer
+
+
+def virtual_grid_layer(grid, crs_authid, layer_name="UrbanMatrix_Grid"):
+    """
+    Memory layer standing in for a grid without materializing its cells.
+
+    It holds a single feature, the grid outline, and the grid spec; cell
+    polygons are only built when a result layer is published.
+    """
+    grid_layer = QgsVectorLayer(f"Polygon?crs={crs_authid}", layer_name, "memory")
+    feature = QgsFeature()
+    outline = shapely.box(grid.x_min, grid.y_min, grid.x_max, grid.y_max)
+    feature.setGeometry(QgsGeometry.fromWkt(outline.wkt))
+    grid_layer.dataProvider().addFeatures([feature])
+    grid_layer.updateExtents()
+    grid_layer.setCustomProperty("urbanmatrix/grid", json.dumps(grid.to_dict()))
+    grid_layer.setCustomProperty("urbanmatrix/virtual_grid", True)
+    return grid_layer
+
+
+def grid_from_layer(layer):
+    """
+    Returns the RegularGrid or HexGrid a layer was generated from, or None.
+    """
+    spec = layer.customProperty("urbanmatrix/grid")
+    if not spec:
+        return None
+    spec = json.loads(spec)
+    return HexGrid.from_dict(spec) if spec.get("kind") == HexGrid.kind else RegularGrid.from_dict(spec)
+
+
+def is_virtual_grid(layer):
+    return str(layer.customProperty("urbanmatrix/virtual_grid", False)).lower() == "true"
+
+
+def create_grid_from_raster(raster_layer, cell_size, grid_name="UrbanMatrix_Grid", virtual=False, valid_only=False,
+                            hexagonal=False):
     """
     Generate a grid layer over the extent of a raster image.
+
+    With virtual=True only the grid outline and spec are stored (see
+    virtual_grid_layer), which keeps very fine grids over whole cities cheap.
+    With valid_only=True cells over nodata areas of the raster (e.g. the
+    collar of a rotated mosaic) are left out. With hexagonal=True the cells
+    are hexagons of the same area as cell_size x cell_size squares.
     """
     if not raster_layer:
         raise ValueError("Raster layer is not provided.")
+    if virtual and valid_only:
+        raise ValueError("A virtual grid always covers the whole raster extent.")
 
     extent = raster_layer.extent()
-    extent_str = f"{extent.xMinimum()},{extent.xMaximum()},{extent.yMinimum()},{extent.yMaximum()}"
-    crs = raster_layer.crs()  # 
-
-    params = {
-        'TYPE': 2,  # Polygon grid
-        'EXTENT': extent_str,
-        'HSPACING': cell_size,
-        'VSPACING': cell_size,
-        'CRS': crs,
-        'OUTPUT': 'memory:' + grid_name
-    }
-
-    result = processing.run("qgis:creategrid", params)
-    grid_layer = result['OUTPUT']
+    crs_authid = raster_layer.crs().authid()
+    grid_type = HexGrid if hexagonal else RegularGrid
+    grid = grid_type.from_extent(extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum(),
+                                 cell_size, crs=crs_authid)
+    print(f"[INFO] Generating a {grid.rows} x {grid.cols} grid ({grid.n_cells} cells)")
+    if virtual:
+        grid_layer = virtual_grid_layer(grid, crs_authid, grid_name)
+    elif valid_only:
+        cell_ids = np.flatnonzero(valid_cell_mask(raster_layer.source(), grid))
+        print(f"[INFO] {len(cell_ids)} of {grid.n_cells} cells cover valid raster data")
+        if len(cell_ids) == 0:
+            raise ValueError("The raster has no valid data.")
+        grid_layer = grid_to_layer(grid, crs_authid, grid_name, cell_ids=cell_ids)
+    else:
+        grid_layer = grid_to_layer(grid, crs_authid, grid_name)
     QgsProject.instance().addMapLayer(grid_layer)
     style_grid(grid_layer) # CALLING IT HERE
 
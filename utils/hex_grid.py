@@ -0,0 +1,190 @@
+import math
+
+import numpy as np
+import shapely
+
+SQRT3 = math.sqrt(3.0)
+
+
+class HexGrid:
+    """
+    Grid of pointy-top hexagons in offset rows, indexed in closed form.
+
+    Row 0 is the top row and odd rows are shifted half a cell to the right.
+    Cells are addressed by row-major id (row * cols + col), like RegularGrid,
+    and map to axial coordinates (q, r) with r = row and
+    q = col - (row - row % 2) / 2, so the cell of any point follows from
+    its coordinates by arithmetic alone.
+    """
+
+    kind = "hex"
+
+    def __init__(self, x0, y0, size, rows, cols, crs=None):
+        # Centre of cell (0, 0) and circumradius of the hexagons
+        self.x0 = float(x0)
+        self.y0 = float(y0)
+        self.size = float(size)
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.crs = crs
+
+    def __repr__(self):
+        return (f"HexGrid(x0={self.x0}, y0={self.y0}, size={self.size}, "
+                f"rows={self.rows}, cols={self.cols})")
+
+    @classmethod
+    def from_extent(cls, x_min, y_min, x_max, y_max, cell_size, crs=None):
+        """
+        Hex grid covering an extent, with cells of the same area as
+        cell_size x cell_size squares.
+        """
+        if cell_size <= 0:
+            raise ValueError("Cell size must be greater than zero.")
+        size = cell_size * math.sqrt(2.0 / (3.0 * SQRT3))
+        # A cell centred on the top-left corner, so the zigzag edges stay outside
+        cols = math.ceil((x_max - x_min) / (SQRT3 * size) - 1e-9) + 1
+        rows = math.ceil((y_max - y_min) / (1.5 * size) - 1e-9) + 1
+        return cls(x_min, y_max, size, rows, cols, crs)
+
+    def to_dict(self):
+        return {"kind": self.kind, "x0": self.x0, "y0": self.y0, "size": self.size,
+                "rows": self.rows, "cols": self.cols, "crs": self.crs}
+
+    @classmethod
+    def from_dict(cls, spec):
+        spec = dict(spec)
+        spec.pop("kind", None)
+        return cls(**spec)
+
+    @property
+    def width(self):
+        # Distance between the centres of neighbouring cells in a row
+        return SQRT3 * self.size
+
+    @property
+    def n_cells(self):
+        return self.rows * self.cols
+
+    @property
+    def cell_area(self):
+        return 1.5 * SQRT3 * self.size ** 2
+
+    @property
+    def x_min(self):
+        return self.x0 - self.width / 2
+
+    @property
+    def x_max(self):
+        return self.x0 + self.width * (self.cols - 0.5 + (0.5 if self.rows > 1 else 0))
+
+    @property
+    def y_max(self):
+        return self.y0 + self.size
+
+    @property
+    def y_min(self):
+        return self.y0 - 1.5 * self.size * (self.rows - 1) - self.size
+
+    def cell_index(self, cell_ids):
+        """
+        Splits row-major cell ids into (row, col) arrays.
+        """
+        return np.divmod(np.asarray(cell_ids, dtype=np.int64), self.cols)
+
+    def axial(self, cell_ids):
+        """
+        Axial coordinates (q, r) of the given cells.
+        """
+        row, col = self.cell_index(cell_ids)
+        return col - (row - (row & 1)) // 2, row
+
+    def centres(self, cell_ids):
+        row, col = self.cell_index(cell_ids)
+        x = self.x0 + self.width * (col + 0.5 * (row & 1))
+        y = self.y0 - 1.5 * self.size * row
+        return x, y
+
+    def cell_ids_at(self, x, y):
+        """
+        Returns the cell containing each point, or -1 outside the grid.
+
+        Points are converted to fractional axial coordinates and rounded to
+        the nearest hexagon in cube coordinates.
+        """
+        u = (np.asarray(x, dtype=float) - self.x0) / self.size
+        v = (self.y0 - np.asarray(y, dtype=float)) / self.size
+        q = SQRT3 / 3 * u - v / 3
+        r = 2 / 3 * v
+        s = -q - r
+
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+
+        row = rr.astype(np.int64)
+        col = rq.astype(np.int64) + (row - (row & 1)) // 2
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row * self.cols + col, -1)
+
+    def cell_bounds(self, cell_ids):
+        """
+        Returns the bounding boxes of the given cells, shape (n, 4).
+        """
+        x, y = self.centres(cell_ids)
+        half = self.width / 2
+        return np.column_stack([x - half, y - self.size, x + half, y + self.size])
+
+    def cell_polygons(self, cell_ids):
+        """
+        Builds the hexagons of the given cells in one vectorized call.
+        """
+        x, y = self.centres(cell_ids)
+        half = self.width / 2
+        dx = np.array([0.0, -half, -half, 0.0, half, half, 0.0])
+        dy = np.array([1.0, 0.5, -0.5, -1.0, -0.5, 0.5, 1.0]) * self.size
+        coords = np.stack([x[:, None] + dx, y[:, None] + dy], axis=-1)
+        return shapely.polygons(coords)
+
+    def cell_ranges(self, bounds):
+        """
+        Maps bounding boxes to the (unclipped) range of rows whose hexagons
+        they overlap, and their x range in cell widths from the centre of
+        column 0 (the overlapped columns depend on the row parity).
+
+        :param bounds: Array of shape (n, 4)
+        :return: Tuple (row0, row1, u_min, u_max)
+        """
+        bounds = np.asarray(bounds, dtype=float)
+        v_min = (self.y0 - bounds[:, 3]) / self.size
+        v_max = (self.y0 - bounds[:, 1]) / self.size
+        row0 = np.ceil((v_min - 1.0) / 1.5).astype(np.int64)
+        row1 = np.floor((v_max + 1.0) / 1.5).astype(np.int64)
+        u_min = (bounds[:, 0] - self.x0) / self.width
+        u_max = (bounds[:, 2] - self.x0) / self.width
+        return row0, row1, u_min, u_max
+
+    def cells_in_bounds(self, bounds):
+        """
+        Lists the cells whose bounding box overlaps each bounding box, a
+        superset of the hexagons actually overlapped.
+
+        :param bounds: Array of shape (n, 4)
+        :return: Tuple (box_idx, cell_ids) of int arrays
+        """
+        row0, row1, u_min, u_max = self.cell_ranges(bounds)
+        row0, row1 = np.clip(row0, 0, self.rows), np.clip(row1, -1, self.rows - 1)
+        # Expand into the rows, then the columns of each row (they depend on its parity)
+        n_rows = np.maximum(row1 - row0 + 1, 0)
+        owner = np.repeat(np.arange(len(n_rows)), n_rows)
+        rows = row0[owner] + np.arange(n_rows.sum()) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+
+        shift = 0.5 * (rows & 1)
+        col0 = np.clip(np.ceil(u_min[owner] - shift - 0.5).astype(np.int64), 0, self.cols)
+        col1 = np.clip(np.floor(u_max[owner] - shift + 0.5).astype(np.int64), -1, self.cols - 1)
+        n_cols = np.maximum(col1 - col0 + 1, 0)
+        box_idx = np.repeat(owner, n_cols)
+        cols = np.repeat(col0, n_cols) + np.arange(n_cols.sum()) - np.repeat(np.cumsum(n_cols) - n_cols, n_cols)
+        return box_idx, np.repeat(rows, n_cols) * self.cols + cols
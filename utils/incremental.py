@@ -0,0 +1,146 @@
+from qgis.core import QgsCoordinateTransform, QgsFeatureRequest, QgsProject, QgsRectangle
+
+from .coverage import building_area_raster, coverage_metrics
+from .layer_conversion import layer_to_geodataframe
+from .matrix_calculation import classify_coverage
+
+
+class IncrementalCoverage:
+    """
+    Keeps a classification result layer in sync with edits to its feature layer.
+
+    Subscribes to the feature layer's geometry-changed, added and deleted
+    signals and recomputes coverage and density class only for the result
+    cells touched by the old and new bounds of the changed features.
+    """
+
+    def __init__(self, result_layer, feature_layer, class_field="density_class"):
+        self.result_layer = result_layer
+        self.feature_layer = feature_layer
+        self.class_field = class_field
+
+        # Settings recorded on the result by calculate_coverage / assign_matrix_scores
+        self.output_field = result_layer.customProperty("urbanmatrix/coverage_field", "coverage_pct")
+        self.method = result_layer.customProperty("urbanmatrix/coverage_method", "auto")
+        if self.method == "overlay":
+            self.method = "auto"
+        self.metrics = tuple(result_layer.customProperty("urbanmatrix/coverage_metrics", []) or [])
+        self.resolution = float(result_layer.customProperty("urbanmatrix/coverage_resolution", 1.0))
+        self.thresholds = [float(v) for v in result_layer.customProperty("urbanmatrix/thresholds", [25, 50, 75])]
+
+        project = QgsProject.instance()
+        self._to_result = QgsCoordinateTransform(feature_layer.crs(), result_layer.crs(), project)
+        self._to_features = QgsCoordinateTransform(result_layer.crs(), feature_layer.crs(), project)
+
+        # Last known bounds of features edited in this session (feature CRS)
+        self._bounds = {}
+
+        result_layer.dataProvider().createSpatialIndex()
+        self.connect()
+
+    def connect(self):
+        self.feature_layer.geometryChanged.connect(self._on_geometry_changed)
+        self.feature_layer.featureAdded.connect(self._on_feature_added)
+        self.feature_layer.featuresDeleted.connect(self._on_features_deleted)
+
+    def disconnect(self):
+        for signal, slot in ((self.feature_layer.geometryChanged, self._on_geometry_changed),
+                             (self.feature_layer.featureAdded, self._on_feature_added),
+                             (self.feature_layer.featuresDeleted, self._on_features_deleted)):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass  # already disconnected or layer deleted
+
+    def _old_bounds(self, fid):
+        """
+        Returns the bounds a feature had before the current change.
+        """
+        if fid in self._bounds:
+            return self._bounds[fid]
+        # Not edited yet in this session: the provider still has the committed geometry
+        for feature in self.feature_layer.dataProvider().getFeatures(QgsFeatureRequest(fid)):
+            if feature.hasGeometry():
+                return feature.geometry().boundingBox()
+        return None
+
+    def _on_geometry_changed(self, fid, geometry):
+        old = self._old_bounds(fid)
+        self._bounds[fid] = geometry.boundingBox()
+        self.update([old, self._bounds[fid]])
+
+    def _on_feature_added(self, fid):
+        feature = self.feature_layer.getFeature(fid)
+        if not feature.hasGeometry():
+            return
+        self._bounds[fid] = feature.geometry().boundingBox()
+        self.update([self._bounds[fid]])
+
+    def _on_features_deleted(self, fids):
+        rects = [self._old_bounds(fid) for fid in fids]
+        for fid in fids:
+            self._bounds.pop(fid, None)
+        self.update(rects)
+
+    def update(self, rects):
+        """
+        Recomputes the result cells intersecting any of the given rectangles.
+
+        :param rects: QgsRectangles in the feature layer CRS (None is ignored)
+        """
+        cell_fids = set()
+        for rect in rects:
+            if rect is None:
+                continue
+            request = QgsFeatureRequest().setFilterRect(self._to_result.transformBoundingBox(rect))
+            request.setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([])
+            cell_fids.update(feature.id() for feature in self.result_layer.getFeatures(request))
+
+        if cell_fids:
+            self.recompute(sorted(cell_fids))
+
+    def recompute(self, cell_fids):
+        """
+        Recomputes building area, coverage and class for the given result cells.
+        """
+        cells = layer_to_geodataframe(
+            self.result_layer, QgsFeatureRequest().setFilterFids(cell_fids), attributes=False, with_fids=True)
+        if cells.empty:
+            return
+
+        # The feature layer's getFeatures() includes uncommitted edits
+        rect = self._to_features.transformBoundingBox(QgsRectangle(*cells.total_bounds))
+        features = layer_to_geodataframe(
+            self.feature_layer, QgsFeatureRequest().setFilterRect(rect), attributes=False)
+        if cells.crs != features.crs:
+            features = features.to_crs(cells.crs)
+
+        errors = None
+        if self.method == "raster":
+            areas, errors = building_area_raster(cells.geometry.values, features.geometry.values, self.resolution)
+            results = {"building_area": areas}
+        else:
+            results = coverage_metrics(cells.geometry.values, features.geometry.values, self.method, self.metrics)
+            areas = results["building_area"]
+        cell_areas = cells.geometry.area.to_numpy()
+        pcts = areas / cell_areas * 100
+
+        fields = self.result_layer.fields()
+        result_idx = {name: fields.indexOf(name) for name in results}
+        pct_idx = fields.indexOf(self.output_field)
+        class_idx = fields.indexOf(self.class_field)
+        err_idx = fields.indexOf(f"{self.output_field}_err")
+
+        changes = {}
+        for i, fid in enumerate(cells.index):
+            values = {idx: float(results[name][i]) for name, idx in result_idx.items() if idx >= 0}
+            values[pct_idx] = float(pcts[i])
+            if class_idx >= 0:
+                values[class_idx] = classify_coverage(pcts[i], *self.thresholds)
+            if errors is not None and err_idx >= 0:
+                values[err_idx] = float(errors[i] / cell_areas[i] * 100)
+            changes[fid] = values
+
+        self.result_layer.dataProvider().changeAttributeValues(changes)
+        self.result_layer.triggerRepaint()
+        print(f"[INFO] Updated coverage for {len(changes)} cells")
@@ -0,0 +1,206 @@
+from itertools import repeat
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from qgis.core import (
+    QgsVectorLayer, QgsFeature, QgsFeatureRequest, QgsGeometry, QgsField, QgsFields,
+    QgsCoordinateReferenceSystem, QgsProject, QgsVectorFileWriter, QgsWkbTypes
+)
+from qgis.PyQt.QtCore import QVariant
+
+# Number of features handed to the data provider per addFeatures call
+WRITE_BATCH_SIZE = 10000
+
+# (single-part type id, multi-part type id, name) as used by shapely.get_type_id
+_GEOMETRY_TYPES = ((0, 4, "Point"), (1, 5, "LineString"), (3, 6, "Polygon"))
+
+
+def _layer_crs(layer):
+    """
+    Returns a CRS definition GeoPandas understands for the given QGIS layer.
+    """
+    crs = layer.crs()
+    if not crs.isValid():
+        return None
+    return crs.authid() or crs.toWkt()
+
+
+def _to_python(value):
+    """
+    Converts QGIS NULL variants to None so pandas sees real missing values.
+    """
+    if isinstance(value, QVariant):
+        return None if value.isNull() else value.value()
+    return value
+
+
+def layer_to_geodataframe(layer, request=None, attributes=True, with_fids=False):
+    """
+    Converts a QgsVectorLayer into a GeoDataFrame entirely in memory.
+
+    Geometries are pulled from getFeatures() as WKB and decoded in a single
+    vectorized shapely call; attributes are collected column by column.
+    No temporary files or GeoJSON serialization are involved.
+
+    :param layer: Source QgsVectorLayer
+    :param request: Optional QgsFeatureRequest (e.g. to filter by extent)
+    :param attributes: If False, only geometries are fetched
+    :param with_fids: Index the frame by feature id instead of 0..n-1
+    :return: GeoDataFrame in the layer's CRS
+    """
+    if request is None:
+        request = QgsFeatureRequest()
+
+    field_names = [field.name() for field in layer.fields()] if attributes else []
+    if not attributes:
+        request.setSubsetOfAttributes([])
+
+    wkbs = []
+    fids = []
+    columns = [[] for _ in field_names]
+    for feature in layer.getFeatures(request):
+        fids.append(feature.id())
+        geom = feature.geometry()
+        wkbs.append(None if geom.isNull() else bytes(geom.asWkb()))
+        if field_names:
+            for column, value in zip(columns, feature.attributes()):
+                column.append(_to_python(value))
+
+    geometry = shapely.from_wkb(np.array(wkbs, dtype=object))
+    data = {name: column for name, column in zip(field_names, columns)}
+    index = pd.Index(fids, name="fid") if with_fids else None
+    return gpd.GeoDataFrame(data, geometry=geometry, crs=_layer_crs(layer), index=index)
+
+
+def fields_from_dataframe(df, columns):
+    """
+    Builds QgsFields for the given DataFrame columns.
+
+    Numeric columns become Double fields, everything else becomes String.
+    """
+    fields = QgsFields()
+    for col in columns:
+        dtype = QVariant.String
+        if pd.api.types.is_numeric_dtype(df[col]):
+            dtype = QVariant.Double
+        fields.append(QgsField(col, dtype))
+    return fields
+
+
+def geometry_type_name(geoms):
+    """
+    Returns the memory provider geometry type matching a shapely geometry array.
+
+    Mixed single/multi-part arrays map to the multi-part type.
+    """
+    type_ids = set(shapely.get_type_id(geoms).tolist())
+    for single, multi, name in _GEOMETRY_TYPES:
+        if multi in type_ids:
+            return "Multi" + name
+        if single in type_ids:
+            return name
+    return "Polygon"
+
+
+def iter_feature_batches(gdf, fields, batch_size=WRITE_BATCH_SIZE, multi=False):
+    """
+    Yields lists of QgsFeature built from a GeoDataFrame, batch_size at a time.
+
+    Geometries are encoded to WKB in one vectorized call and attributes are
+    read column-wise (as native Python values), never row by row.
+
+    :param gdf: GeoDataFrame to convert
+    :param fields: QgsFields matching the non-geometry columns, in order
+    :param batch_size: Number of features per yielded list
+    :param multi: Promote single-part geometries to multi-part
+    """
+    names = [field.name() for field in fields]
+    wkbs = shapely.to_wkb(gdf.geometry.values)
+    columns = [gdf[name].tolist() for name in names]
+
+    for start in range(0, len(gdf), batch_size):
+        stop = min(start + batch_size, len(gdf))
+        rows = zip(*(column[start:stop] for column in columns)) if columns else repeat(())
+        batch = []
+        for wkb, values in zip(wkbs[start:stop], rows):
+            feat = QgsFeature(fields)
+            if wkb is not None:
+                geom = QgsGeometry()
+                geom.fromWkb(wkb)
+                if multi:
+                    geom.convertToMultiType()
+                feat.setGeometry(geom)
+            feat.setAttributes(list(values))
+            batch.append(feat)
+        yield batch
+
+
+def write_geodataframe(sink, gdf, fields, batch_size=WRITE_BATCH_SIZE, multi=False):
+    """
+    Writes a GeoDataFrame into anything with addFeatures (a data provider,
+    QgsVectorFileWriter, ...), one addFeatures call per batch.
+
+    :return: Number of features written
+    """
+    written = 0
+    for batch in iter_feature_batches(gdf, fields, batch_size, multi):
+        result = sink.addFeatures(batch)
+        # Data providers return (ok, features), file writers just ok
+        if not (result[0] if isinstance(result, tuple) else result):
+            raise RuntimeError("Could not write features to the output layer.")
+        written += len(batch)
+    return written
+
+
+def geodataframe_to_layer(gdf, layer_name, crs_authid, geometry_type=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    Converts a GeoDataFrame into a QGIS memory layer in batches.
+
+    :param gdf: GeoDataFrame to convert
+    :param layer_name: Name of the new memory layer
+    :param crs_authid: Authority id of the layer CRS (e.g. "EPSG:25832")
+    :param geometry_type: Memory provider geometry type (inferred if None)
+    :param batch_size: Number of features per addFeatures call
+    :return: QgsVectorLayer
+    """
+    columns = [col for col in gdf.columns if col != gdf.geometry.name]
+    fields = fields_from_dataframe(gdf, columns)
+    geometry_type = geometry_type or geometry_type_name(gdf.geometry.values)
+
+    mem_layer = QgsVectorLayer(f"{geometry_type}?crs={crs_authid}", layer_name, "memory")
+    mem_provider = mem_layer.dataProvider()
+    mem_provider.addAttributes(fields)
+    mem_layer.updateFields()
+
+    write_geodataframe(mem_provider, gdf, mem_layer.fields(), batch_size, geometry_type.startswith("Multi"))
+    mem_layer.updateExtents()
+    return mem_layer
+
+
+def create_vector_file(path, layer_name, fields, geometry_type, crs_authid):
+    """
+    Creates a GeoPackage (or FlatGeobuf for .fgb paths) with a spatial index.
+
+    Features are appended with write_geodataframe; delete the returned
+    writer to flush and close the file.
+
+    :param path: Output file path
+    :param layer_name: Name of the layer inside the file
+    :param fields: QgsFields of the layer
+    :param geometry_type: Geometry type name (e.g. "MultiPolygon")
+    :param crs_authid: Authority id of the layer CRS
+    :return: QgsVectorFileWriter
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "FlatGeobuf" if path.lower().endswith(".fgb") else "GPKG"
+    options.layerName = layer_name
+    options.layerOptions = ["SPATIAL_INDEX=YES"]
+
+    writer = QgsVectorFileWriter.create(
+        path, fields, QgsWkbTypes.parseType(geometry_type), QgsCoordinateReferenceSystem(crs_authid),
+        QgsProject.instance().transformContext(), options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f"Could not create {path}: {writer.errorMessage()}")
+    return writer
@@ -1,9 +1,43 @@
+import numpy as np
 from qgis.core import QgsField, QgsFeature
 from qgis.PyQt.QtCore import QVariant
 
+# Matrix Method classes, from lowest to highest coverage
+DENSITY_CLASSES = ("Low", "Moderate", "High", "Very High")
+
+
+def classify_coverage(value, low_thresh=25, mid_thresh=50, high_thresh=75):
+    """
+    Returns the Matrix Method class for a single coverage percentage.
+    """
+    try:
+        pct = float(value)
+    except (TypeError, ValueError):
+        return "NoData"
+
+    if pct < low_thresh:
+        return "Low"
+    elif pct < mid_thresh:
+        return "Moderate"
+    elif pct < high_thresh:
+        return "High"
+    return "Very High"
+
+
+def classify_coverage_array(values, low_thresh=25, mid_thresh=50, high_thresh=75):
+    """
+    Returns the Matrix Method class of every coverage percentage in an array,
+    with the same rules as classify_coverage (NaN is NoData).
+    """
+    values = np.asarray(values, dtype=float)
+    classes = np.array(DENSITY_CLASSES + ("NoData",), dtype=object)
+    index = np.digitize(values, [low_thresh, mid_thresh, high_thresh])
+    return classes[np.where(np.isnan(values), len(DENSITY_CLASSES), index)]
+
+
 def assign_matrix_scores(layer, low_thresh=25, mid_thresh=50, high_thresh=75,
                          input_field="coverage_pct", output_field="density_class"):
-    from qgis.core import QgsField
+    from qgis.core import QgsFeatureRequest, QgsField
     from qgis.PyQt.QtCore import QVariant
 
     if output_field not in [f.name() for f in layer.fields()]:
@@ -12,26 +46,15 @@ def assign_matrix_scores(layer, low_thresh=25, mid_thresh=50, high_thresh=75,
 
     field_index = layer.fields().indexOf(output_field)
 
-    for feature in layer.getFeatures():
-        try:
-            pct = float(feature[input_field])
-        except (TypeError, ValueError):
-            pct = None
-
-        if pct is None:
-            category = "NoData"
-        elif pct < low_thresh:
-            category = "Low"
-        elif pct < mid_thresh:
-            category = "Moderate"
-        elif pct < high_thresh:
-            category = "High"
-        else:
-            category = "Very High"
-
-        feature.setAttribute(field_index, category)
-        layer.dataProvider().changeAttributeValues({feature.id(): {field_index: category}})
+    # One provider call for the whole layer
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([input_field], layer.fields())
+    changes = {feature.id(): {field_index: classify_coverage(feature[input_field], low_thresh, mid_thresh, high_thresh)}
+               for feature in layer.getFeatures(request)}
+    layer.dataProvider().changeAttributeValues(changes)
 
+    # Remembered so incremental updates classify new values the same way
+    layer.setCustomProperty("urbanmatrix/thresholds", [low_thresh, mid_thresh, high_thresh])
     layer.updateFields()
     layer.triggerRepaint()
 
@@ -0,0 +1,207 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+import requests
+import shapely
+
+from .disk_cache import default_cache_dir
+
+# Global index of the Microsoft building footprint tiles, overridden by the
+# URBANMATRIX_MS_INDEX_URL environment variable (e.g. for a mirror or a mock server)
+INDEX_URL = "https://minedbuildings.z5.web.core.windows.net/global-buildings/dataset-links.csv"
+
+# Seconds a cached index is used before it is revalidated with the server
+INDEX_TTL = 24 * 3600
+
+# Zoom level of the quadkeys in the index
+TILE_ZOOM = 9
+
+# Indexes already parsed in this session: url -> (loaded_at, {QuadKey: [rows]})
+_loaded_indexes = {}
+
+
+def index_url():
+    """
+    Returns the index location in use (environment override or INDEX_URL).
+    """
+    return os.environ.get("URBANMATRIX_MS_INDEX_URL") or INDEX_URL
+
+
+def _index_paths(url):
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    directory = default_cache_dir("ms_index")
+    return os.path.join(directory, f"{name}.csv"), os.path.join(directory, f"{name}.json")
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_index(url=None, ttl=INDEX_TTL, session=None, timeout=60):
+    """
+    Makes sure a local copy of the index CSV exists and is fresh.
+
+    A copy younger than ttl is used as is. Older copies are revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged index costs one
+    304 response. If the server cannot be reached, the stale copy is used.
+
+    :return: Path of the cached CSV file
+    """
+    url = url or index_url()
+    csv_path, meta_path = _index_paths(url)
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    have_copy = os.path.exists(csv_path)
+    if have_copy and time.time() - meta.get("checked_at", 0) < ttl:
+        return csv_path
+
+    headers = {}
+    if have_copy and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if have_copy and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            print("[INFO] Building index unchanged, using cached copy")
+            meta["checked_at"] = time.time()
+            _write_json(meta_path, meta)
+            return csv_path
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if have_copy:
+            print(f"[WARN] Could not revalidate building index ({e}), using cached copy")
+            return csv_path
+        raise
+
+    print(f"[INFO] Downloaded building index from {url}")
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, csv_path)
+    _write_json(meta_path, {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "checked_at": time.time(),
+    })
+    return csv_path
+
+
+def parse_index(path):
+    """
+    Reads the index CSV into a dict keyed by QuadKey.
+
+    :return: {QuadKey: [row, ...]} with rows as dicts of the CSV columns
+    """
+    index = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            index.setdefault(row["QuadKey"], []).append(row)
+    return index
+
+
+def load_index(url=None, ttl=INDEX_TTL, session=None):
+    """
+    Returns the index as {QuadKey: [row, ...]}, parsed once per session.
+
+    :param url: Index CSV location (see index_url)
+    :param ttl: Seconds before the cached copy is revalidated
+    :param session: Optional requests.Session to use
+    """
+    url = url or index_url()
+    loaded = _loaded_indexes.get(url)
+    if loaded is None or time.time() - loaded[0] >= ttl:
+        loaded = (time.time(), parse_index(fetch_index(url, ttl, session)))
+        _loaded_indexes[url] = loaded
+    return loaded[1]
+
+
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(text):
+    """
+    Converts an index Size entry such as "12.3MB" to bytes (None if unknown).
+    """
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?B)\s*", text or "", re.IGNORECASE)
+    if match is None:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+class PlannedTile(namedtuple("PlannedTile", "quadkey url size location")):
+    """
+    One file to fetch: a partition of a quadkey tile, with its size in bytes.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.quadkey}:{self.url.rsplit('/', 1)[-1]}"
+
+
+def extent_to_wgs84(extent, crs, densify=64):
+    """
+    Transforms an extent to an EPSG:4326 polygon.
+
+    The rectangle is densified first, so the polygon follows edges that
+    become curved or rotated after reprojection.
+
+    :param extent: Tuple (minx, miny, maxx, maxy)
+    :param crs: CRS of the extent (e.g. "EPSG:25832")
+    :param densify: Number of segments along the longer side
+    """
+    import geopandas as gpd
+
+    minx, miny, maxx, maxy = extent
+    rect = shapely.box(minx, miny, maxx, maxy)
+    step = max(maxx - minx, maxy - miny) / densify
+    if step > 0:
+        rect = shapely.segmentize(rect, step)
+    return gpd.GeoSeries([rect], crs=crs).to_crs("EPSG:4326").iloc[0]
+
+
+def plan_tiles(index, aoi, zoom=TILE_ZOOM):
+    """
+    Lists every file needed to cover an AOI.
+
+    Tiles are taken from the AOI's bbox and kept only if they intersect the
+    AOI polygon itself; every partition listed for a kept quadkey is
+    included.
+
+    :param index: Dict returned by load_index
+    :param aoi: Polygon in EPSG:4326 (see extent_to_wgs84)
+    :return: List of PlannedTile
+    """
+    import mercantile
+
+    shapely.prepare(aoi)
+    plan = []
+    for tile in mercantile.tiles(*aoi.bounds, zooms=zoom):
+        west, south, east, north = mercantile.bounds(tile)
+        if not aoi.intersects(shapely.box(west, south, east, north)):
+            continue
+        quadkey = mercantile.quadkey(tile)
+        for row in index.get(quadkey, []):
+            plan.append(PlannedTile(quadkey, row["Url"], parse_size(row.get("Size")), row.get("Location")))
+    return plan
+
+
+def describe_plan(plan):
+    """
+    One-line summary of a plan: files, quadkeys and total size.
+    """
+    quadkeys = {tile.quadkey for tile in plan}
+    size = sum(tile.size or 0 for tile in plan)
+    return f"{len(plan)} files in {len(quadkeys)} quadkeys, {size / 1024 ** 2:.1f} MB"
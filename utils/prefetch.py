@@ -0,0 +1,117 @@
+"""
+Pre-downloads Microsoft building tiles into the local tile store, without QGIS.
+
+Run from the plugin directory, e.g.:
+
+    python -m utils.prefetch --bbox 8.3 48.9 8.5 49.1
+    python -m utils.prefetch --polygon region.geojson --workers 8
+
+Tiles already in the store are skipped, so an interrupted run can simply be
+started again. The plugin then serves downloads for the region from disk.
+Regions larger than the store's size cap are refused, since the store would
+evict the first tiles to make room for the last; raise it with --max-cache-mb.
+"""
+import argparse
+import os
+import sys
+
+from .ms_index import describe_plan, extent_to_wgs84, load_index, plan_tiles
+from .tile_download import DOWNLOAD_WORKERS, download_tiles
+from .tile_parser import iter_lines, parse_tile
+from .tile_store import TileStore
+
+
+def read_region(path):
+    """
+    Reads a polygon file (anything GeoPandas can open) as one EPSG:4326 polygon.
+    """
+    import geopandas as gpd
+
+    region = gpd.read_file(path)
+    if region.crs is not None:
+        region = region.to_crs("EPSG:4326")
+    return region.geometry.union_all() if hasattr(region.geometry, "union_all") else region.geometry.unary_union
+
+
+def prefetch_tiles(plan, store, workers=DOWNLOAD_WORKERS):
+    """
+    Downloads every planned tile that is not in the store yet.
+
+    Tiles are stored whole, as soon as each one is parsed.
+
+    :param plan: List of PlannedTile (see ms_index.plan_tiles)
+    :param store: TileStore to fill
+    :param workers: Number of tiles downloaded at the same time
+    :return: Tuple (number of downloaded tiles still in the store, list of
+        failed tiles)
+    :raises ValueError: If the plan does not fit under the store's size cap
+    """
+    plan_bytes = sum(tile.size or 0 for tile in plan)
+    if plan_bytes > store.cache.max_bytes:
+        raise ValueError(f"The region needs about {plan_bytes / 1024 ** 2:.1f} MB but the tile store is capped "
+                         f"at {store.cache.max_bytes / 1024 ** 2:.1f} MB; raise the cap with --max-cache-mb.")
+
+    missing = [tile for tile in plan if (tile.quadkey, tile.url) not in store]
+    print(f"[INFO] {len(plan) - len(missing)} of {len(plan)} tiles already cached")
+
+    def parse(tile, url, content):
+        return parse_tile(iter_lines(content))
+
+    downloaded = []
+    failed = []
+    for tile, arrays, error in download_tiles(((tile, tile.url) for tile in missing), parse, workers=workers):
+        if error is not None:
+            failed.append(tile)
+            continue
+        store.put(tile.quadkey, tile.url, arrays)
+        downloaded.append(tile)
+
+    # Sizes in the index are only estimates, so check what the cap left behind
+    stored = sum((tile.quadkey, tile.url) in store for tile in downloaded)
+    if stored < len(downloaded):
+        print(f"[WARN] {len(downloaded) - stored} downloaded tiles were evicted again by the size cap")
+    return stored, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.prefetch",
+        description="Pre-download Microsoft building tiles for a region into the UrbanMatrix cache.")
+    region = parser.add_mutually_exclusive_group(required=True)
+    region.add_argument("--bbox", nargs=4, type=float, metavar=("MINX", "MINY", "MAXX", "MAXY"),
+                        help="region extent, in --crs coordinates")
+    region.add_argument("--polygon", metavar="FILE", help="polygon file outlining the region")
+    parser.add_argument("--crs", default="EPSG:4326", help="CRS of --bbox (default: EPSG:4326)")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="parallel downloads")
+    parser.add_argument("--cache-dir", help="cache directory (default: the shared UrbanMatrix cache)")
+    parser.add_argument("--max-cache-mb", "--max-mb", dest="max_cache_mb", type=float,
+                        help="size cap of the tile store in MB (default: URBANMATRIX_TILE_CACHE_MB or 2048)")
+    parser.add_argument("--index-url", help="location of dataset-links.csv (default: the Microsoft index)")
+    parser.add_argument("--dry-run", action="store_true", help="only print the download plan")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir:
+        os.environ["URBANMATRIX_CACHE_DIR"] = args.cache_dir
+
+    aoi = read_region(args.polygon) if args.polygon else extent_to_wgs84(args.bbox, args.crs)
+    plan = plan_tiles(load_index(args.index_url), aoi)
+    print(f"[INFO] Download plan: {describe_plan(plan)}")
+    if args.dry_run:
+        for tile in plan:
+            print(f"{tile.quadkey}\t{tile.size or ''}\t{tile.url}")
+        return 0
+
+    try:
+        stored, failed = prefetch_tiles(plan, TileStore(max_mb=args.max_cache_mb), args.workers)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    print(f"[INFO] Stored {stored} tiles")
+    if failed:
+        print(f"[WARN] {len(failed)} tiles failed, run again to retry: {', '.join(map(str, failed))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
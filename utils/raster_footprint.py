@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+import shapely
+
+from .regular_grid import RegularGrid
+
+# Pixels read from the raster mask at a time
+FOOTPRINT_MAX_PIXELS = 16_000_000
+
+# Fraction of a pixel by which corners are moved towards its centre
+CORNER_INSET = 1e-6
+
+
+def mark_valid_pixels(cell_mask, grid, valid, geotransform, row_offset=0):
+    """
+    Flags the grid cells overlapped by a valid pixel.
+
+    The cells under the four pixel corners are found by arithmetic. Since
+    cells are convex, a pixel whose corners all fall in one cell lies
+    inside it; only pixels straddling cell edges are matched against every
+    cell their footprint overlaps.
+
+    :param cell_mask: Boolean (grid.rows, grid.cols) array, updated in place
+    :param grid: RegularGrid or HexGrid in the raster CRS
+    :param valid: Boolean array of a strip of raster rows
+    :param geotransform: GDAL geotransform of the raster (or overview) read
+    :param row_offset: Raster row of the first row of the strip
+    """
+    pixel_row, pixel_col = np.nonzero(valid)
+    if len(pixel_row) == 0:
+        return cell_mask
+    flat_mask = cell_mask.reshape(-1)
+
+    corners_x, corners_y, corner_ids = [], [], []
+    # Corners are pulled in slightly, so pixels merely touching a cell edge
+    # (e.g. pixels aligned with the grid) do not count as overlapping it
+    for dx, dy in ((0, 0), (1, 0), (1, 1), (0, 1)):
+        px = pixel_col + 0.5 + (dx - 0.5) * (1 - CORNER_INSET)
+        py = pixel_row + row_offset + 0.5 + (dy - 0.5) * (1 - CORNER_INSET)
+        x = geotransform[0] + px * geotransform[1] + py * geotransform[2]
+        y = geotransform[3] + px * geotransform[4] + py * geotransform[5]
+        corners_x.append(x)
+        corners_y.append(y)
+        corner_ids.append(grid.cell_ids_at(x, y))
+    corner_ids = np.stack(corner_ids)
+    flat_mask[corner_ids[corner_ids >= 0]] = True
+
+    straddling = np.flatnonzero((corner_ids != corner_ids[0]).any(axis=0) | (corner_ids[0] < 0))
+    if len(straddling) == 0:
+        return cell_mask
+    xs = np.stack(corners_x)[:, straddling].T
+    ys = np.stack(corners_y)[:, straddling].T
+    bounds = np.column_stack([xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)])
+    pixel_idx, cell_ids = grid.cells_in_bounds(bounds)
+
+    rotated = geotransform[2] != 0 or geotransform[4] != 0
+    if rotated or not isinstance(grid, RegularGrid):
+        # Candidates come from bounding boxes, keep the cells really overlapped
+        pixels = shapely.polygons(np.stack([xs, ys], axis=-1)[pixel_idx])
+        cells = grid.cell_polygons(cell_ids)
+        overlap = shapely.intersects(pixels, cells) & ~shapely.touches(pixels, cells)
+        cell_ids = cell_ids[overlap]
+    flat_mask[cell_ids] = True
+    return cell_mask
+
+
+def _overview_level(band, pixel_size, cell_size):
+    """
+    Returns the coarsest overview (or the band itself) whose pixels are
+    still at most half a cell wide, so the footprint follows the valid
+    data closely.
+    """
+    chosen = band
+    for i in range(band.GetOverviewCount()):
+        overview = band.GetOverview(i)
+        size = pixel_size * band.XSize / overview.XSize
+        if size <= cell_size / 2 and overview.XSize < chosen.XSize:
+            chosen = overview
+    return chosen
+
+
+def valid_cell_mask(path, grid, max_pixels=FOOTPRINT_MAX_PIXELS):
+    """
+    Finds the cells of a grid covering valid (not nodata) raster pixels.
+
+    The GDAL mask bands (nodata values, alpha band or mask file) are read
+    strip by strip, from an overview when one is fine enough, and a pixel
+    counts as valid when any band is valid there.
+
+    :param path: Raster file readable by GDAL
+    :param grid: RegularGrid or HexGrid in the raster CRS
+    :param max_pixels: Maximum number of mask pixels read at once
+    :return: Boolean (grid.rows, grid.cols) array
+    """
+    from osgeo import gdal
+
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise RuntimeError(f"Could not open {path}")
+
+    base_transform = dataset.GetGeoTransform()
+    pixel_size = abs(base_transform[1])
+    first = dataset.GetRasterBand(1)
+    # One mask serves all bands when it is per dataset
+    bands = [first] if first.GetMaskFlags() & gdal.GMF_PER_DATASET else \
+        [dataset.GetRasterBand(i + 1) for i in range(dataset.RasterCount)]
+
+    cell_mask = np.zeros((grid.rows, grid.cols), dtype=bool)
+    if any(band.GetMaskFlags() & gdal.GMF_ALL_VALID for band in bands):
+        cell_mask[:] = True
+        return cell_mask
+
+    cell_size = math.sqrt(grid.cell_area)
+    levels = [_overview_level(band, pixel_size, cell_size) for band in bands]
+    masks = [level.GetMaskBand() for level in levels]
+    x_size, y_size = levels[0].XSize, levels[0].YSize
+    # Geotransform scaled to the overview read
+    sx, sy = dataset.RasterXSize / x_size, dataset.RasterYSize / y_size
+    transform = (base_transform[0], base_transform[1] * sx, base_transform[2] * sy,
+                 base_transform[3], base_transform[4] * sx, base_transform[5] * sy)
+    print(f"[INFO] Reading the valid-data mask at {x_size} x {y_size} pixels")
+
+    block_rows = masks[0].GetBlockSize()[1] or 1
+    strip_rows = max(block_rows, max_pixels // max(1, x_size) // block_rows * block_rows)
+    for row in range(0, y_size, strip_rows):
+        n_rows = min(strip_rows, y_size - row)
+        valid = np.zeros((n_rows, x_size), dtype=bool)
+        for mask in masks:
+            valid |= mask.ReadAsArray(0, row, x_size, n_rows) > 0
+        mark_valid_pixels(cell_mask, grid, valid, transform, row)
+    return cell_mask
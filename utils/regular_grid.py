@@ -0,0 +1,233 @@
+import math
+
+import numpy as np
+import shapely
+
+
+class RegularGrid:
+    """
+    Axis-aligned grid of equally sized rectangular cells.
+
+    Row 0 is the top row and column 0 the leftmost column, matching the
+    layout produced by create_grid_from_raster. Cells are addressed by
+    row-major id (row * cols + col); since origin, cell size and shape fully
+    describe the grid, cell geometry is only built when asked for.
+    """
+
+    def __init__(self, x_min, y_max, cell_width, cell_height, rows, cols, crs=None):
+        self.x_min = float(x_min)
+        self.y_max = float(y_max)
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height)
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.crs = crs
+
+    def __repr__(self):
+        return (f"RegularGrid(x_min={self.x_min}, y_max={self.y_max}, "
+                f"cell_width={self.cell_width}, cell_height={self.cell_height}, "
+                f"rows={self.rows}, cols={self.cols})")
+
+    @classmethod
+    def from_extent(cls, x_min, y_min, x_max, y_max, cell_width, cell_height=None, crs=None):
+        """
+        Grid anchored at the top-left corner of an extent that covers it fully.
+
+        As with qgis:creategrid, the last row and column may extend past the
+        extent when its size is not a multiple of the cell size.
+        """
+        cell_height = cell_height or cell_width
+        if cell_width <= 0 or cell_height <= 0:
+            raise ValueError("Cell size must be greater than zero.")
+        # Tolerate rounding when the extent is an exact multiple of the cell size
+        cols = max(1, math.ceil((x_max - x_min) / cell_width - 1e-9))
+        rows = max(1, math.ceil((y_max - y_min) / cell_height - 1e-9))
+        return cls(x_min, y_max, cell_width, cell_height, rows, cols, crs)
+
+    def to_dict(self):
+        return {"x_min": self.x_min, "y_max": self.y_max, "cell_width": self.cell_width,
+                "cell_height": self.cell_height, "rows": self.rows, "cols": self.cols, "crs": self.crs}
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(**spec)
+
+    @property
+    def n_cells(self):
+        return self.rows * self.cols
+
+    @property
+    def cell_area(self):
+        return self.cell_width * self.cell_height
+
+    @property
+    def x_max(self):
+        return self.x_min + self.cols * self.cell_width
+
+    @property
+    def y_min(self):
+        return self.y_max - self.rows * self.cell_height
+
+    def coarsen(self, factor):
+        """
+        Grid with the same origin and cells factor x factor times larger.
+
+        The coarse grid covers the whole fine grid, so its last row and
+        column extend past it when rows/cols are not multiples of factor.
+        """
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError("Coarsening factor must be a positive integer.")
+        return RegularGrid(self.x_min, self.y_max, self.cell_width * factor, self.cell_height * factor,
+                           math.ceil(self.rows / factor), math.ceil(self.cols / factor), self.crs)
+
+    def block_sum(self, values, factor):
+        """
+        Sums per-cell values over factor x factor blocks of cells.
+
+        :param values: Dense array indexed by cell id
+        :return: Dense array indexed by cell id of self.coarsen(factor)
+        """
+        coarse = self.coarsen(factor)
+        padded = np.zeros((coarse.rows * factor, coarse.cols * factor))
+        padded[:self.rows, :self.cols] = np.asarray(values).reshape(self.rows, self.cols)
+        return padded.reshape(coarse.rows, factor, coarse.cols, factor).sum(axis=(1, 3)).ravel()
+
+    def block_area(self, factor):
+        """
+        Area of the cells inside each factor x factor block.
+
+        Blocks on the last coarse row and column only hold part of a block of
+        cells when rows/cols are not multiples of factor, so this is the area
+        of the coarse cells clipped to the grid.
+
+        :return: Dense array indexed by cell id of self.coarsen(factor)
+        """
+        return self.block_sum(np.full(self.n_cells, self.cell_area), factor)
+
+    def coarse_cell_ids(self, cell_ids, factor):
+        """
+        Maps cell ids to the cells of self.coarsen(factor) containing them.
+
+        :return: Sorted unique cell ids of the coarse grid
+        """
+        row, col = self.cell_index(cell_ids)
+        return np.unique((row // factor) * math.ceil(self.cols / factor) + col // factor)
+
+    def cell_index(self, cell_ids):
+        """
+        Splits row-major cell ids (row * cols + col) into (row, col) arrays.
+        """
+        return np.divmod(np.asarray(cell_ids, dtype=np.int64), self.cols)
+
+    def cell_ids_at(self, x, y):
+        """
+        Returns the cell containing each point, or -1 outside the grid.
+        """
+        col = np.floor((np.asarray(x, dtype=float) - self.x_min) / self.cell_width).astype(np.int64)
+        row = np.floor((self.y_max - np.asarray(y, dtype=float)) / self.cell_height).astype(np.int64)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row * self.cols + col, -1)
+
+    def cell_bounds(self, cell_ids):
+        """
+        Returns the bounds of the given cells.
+
+        :param cell_ids: Row-major cell ids
+        :return: Array of shape (n, 4) with minx, miny, maxx, maxy
+        """
+        row, col = self.cell_index(cell_ids)
+        minx = self.x_min + col * self.cell_width
+        maxy = self.y_max - row * self.cell_height
+        return np.column_stack([minx, maxy - self.cell_height, minx + self.cell_width, maxy])
+
+    def cell_polygons(self, cell_ids):
+        """
+        Builds the rectangles of the given cells in one vectorized call.
+        """
+        return shapely.box(*self.cell_bounds(cell_ids).T)
+
+    def cell_ranges(self, bounds, closed=False):
+        """
+        Maps bounding boxes to the (unclipped) row/col ranges they overlap.
+
+        :param bounds: Array of shape (n, 4) with minx, miny, maxx, maxy
+        :param closed: Also include the cells a box only touches along an edge
+        :return: Tuple (row0, row1, col0, col1) of int arrays, inclusive
+        """
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        minx, miny, maxx, maxy = bounds.T
+        x0, x1 = (minx - self.x_min) / self.cell_width, (maxx - self.x_min) / self.cell_width
+        y0, y1 = (self.y_max - maxy) / self.cell_height, (self.y_max - miny) / self.cell_height
+        if closed:
+            col0, col1 = np.ceil(x0) - 1, np.floor(x1)
+            row0, row1 = np.ceil(y0) - 1, np.floor(y1)
+        else:
+            col0, col1 = np.floor(x0), np.ceil(x1) - 1
+            row0, row1 = np.floor(y0), np.ceil(y1) - 1
+        col1 = np.maximum(col1, col0)
+        row1 = np.maximum(row1, row0)
+        return row0.astype(np.int64), row1.astype(np.int64), col0.astype(np.int64), col1.astype(np.int64)
+
+    def cells_in_bounds(self, bounds):
+        """
+        Lists the cells overlapped by each bounding box (edges touching a
+        cell do not count).
+
+        :param bounds: Array of shape (n, 4)
+        :return: Tuple (box_idx, cell_ids) of int arrays
+        """
+        row0, row1, col0, col1 = self.cell_ranges(bounds)
+        row0, row1 = np.clip(row0, 0, self.rows), np.clip(row1, -1, self.rows - 1)
+        col0, col1 = np.clip(col0, 0, self.cols), np.clip(col1, -1, self.cols - 1)
+        n_cols = np.maximum(col1 - col0 + 1, 0)
+        n_cells = np.maximum(row1 - row0 + 1, 0) * n_cols
+
+        box_idx = np.repeat(np.arange(len(n_cells)), n_cells)
+        offset = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        rows = row0[box_idx] + offset // np.maximum(n_cols[box_idx], 1)
+        cols = col0[box_idx] + offset % np.maximum(n_cols[box_idx], 1)
+        return box_idx, rows * self.cols + cols
+
+    @classmethod
+    def detect(cls, cells, rel_tol=1e-6):
+        """
+        Checks whether an array of polygons forms a regular axis-aligned grid.
+
+        :param cells: Array of shapely polygons (one per grid feature)
+        :param rel_tol: Tolerance relative to the cell size
+        :return: Tuple (grid, row_idx, col_idx) locating each cell, or None
+        """
+        cells = np.asarray(cells, dtype=object)
+        if len(cells) == 0 or shapely.is_missing(cells).any():
+            return None
+
+        minx, miny, maxx, maxy = shapely.bounds(cells).T
+        width = maxx - minx
+        height = maxy - miny
+        cell_width, cell_height = width[0], height[0]
+        if cell_width <= 0 or cell_height <= 0:
+            return None
+
+        tol_x = cell_width * rel_tol
+        tol_y = cell_height * rel_tol
+        if (np.abs(width - cell_width) > tol_x).any() or (np.abs(height - cell_height) > tol_y).any():
+            return None
+
+        # A polygon whose area equals its bounding box area is that rectangle
+        if (np.abs(shapely.area(cells) - width * height) > cell_width * cell_height * rel_tol).any():
+            return None
+
+        x_min = minx.min()
+        y_max = maxy.max()
+        col_idx = np.rint((minx - x_min) / cell_width).astype(np.int64)
+        row_idx = np.rint((y_max - maxy) / cell_height).astype(np.int64)
+        if (np.abs(minx - (x_min + col_idx * cell_width)) > tol_x).any():
+            return None
+        if (np.abs(maxy - (y_max - row_idx * cell_height)) > tol_y).any():
+            return None
+
+        grid = cls(x_min, y_max, cell_width, cell_height, row_idx.max() + 1, col_idx.max() + 1)
+        if len(np.unique(row_idx * grid.cols + col_idx)) != len(cells):
+            return None
+        return grid, row_idx, col_idx
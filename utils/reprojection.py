@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+# Threads used to reproject geometries (PROJ releases the GIL)
+REPROJECT_WORKERS = os.cpu_count() or 1
+
+# Geometries per reprojection task
+REPROJECT_CHUNK_SIZE = 50000
+
+# Growth of the AOI for the prefilter, relative to its size, so buildings on
+# the (approximated) AOI edge are never dropped before the exact test
+AOI_TOLERANCE = 1e-4
+
+
+def select_in_aoi(geoms, aoi):
+    """
+    Returns the indices of the geometries intersecting an AOI polygon.
+
+    A slightly grown AOI is queried against an STRtree of the geometries,
+    so the result is a superset of the exact answer, suitable for
+    filtering before reprojection.
+
+    :param geoms: Array of shapely geometries
+    :param aoi: Polygon in the same CRS
+    :return: Sorted index array
+    """
+    if len(geoms) == 0:
+        return np.empty(0, dtype=np.int64)
+    minx, miny, maxx, maxy = aoi.bounds
+    grown = aoi.buffer(AOI_TOLERANCE * max(maxx - minx, maxy - miny))
+    return np.sort(shapely.STRtree(geoms).query(grown, predicate="intersects"))
+
+
+def _transform_chunk(geoms, src_crs, dst_crs):
+    # Transformers are not thread-safe, so every task builds its own
+    transformer = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    return shapely.transform(geoms, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+
+def reproject_geometries(geoms, src_crs, dst_crs, workers=REPROJECT_WORKERS, chunk_size=REPROJECT_CHUNK_SIZE):
+    """
+    Reprojects geometries in chunks spread over threads.
+
+    :param geoms: Array of shapely geometries (2D)
+    :param src_crs: CRS of the geometries (anything pyproj accepts)
+    :param dst_crs: Target CRS
+    :return: Array of reprojected geometries, in input order
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    if len(geoms) == 0:
+        return geoms
+    chunks = [geoms[start:start + chunk_size] for start in range(0, len(geoms), chunk_size)]
+    if workers <= 1 or len(chunks) == 1:
+        return np.concatenate([_transform_chunk(chunk, src_crs, dst_crs) for chunk in chunks])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_transform_chunk, chunks, [src_crs] * len(chunks), [dst_crs] * len(chunks))
+        return np.concatenate(list(results))
+
+
+def clip_to_aoi(gdf, crs, aoi, rect_geom):
+    """
+    Returns the buildings of a batch intersecting the AOI, in the AOI CRS.
+
+    Buildings are first selected against the AOI in the batch's own CRS
+    (usually EPSG:4326), so only the retained ones are reprojected.
+
+    :param gdf: Batch of buildings in any (defined) CRS
+    :param crs: Target CRS (that of rect_geom)
+    :param aoi: AOI polygon in EPSG:4326
+    :param rect_geom: AOI rectangle in the target CRS
+    """
+    if gdf.crs is None:
+        raise ValueError("Buildings without a coordinate reference system cannot be matched to the AOI.")
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    if gdf.crs != crs:
+        if gdf.crs != "EPSG:4326":
+            aoi = gpd.GeoSeries([aoi], crs="EPSG:4326").to_crs(gdf.crs).iloc[0]
+        geoms = reproject_geometries(geoms[select_in_aoi(geoms, aoi)], gdf.crs, crs)
+
+    # Exact test in the AOI CRS
+    geoms = geoms[shapely.intersects(geoms, rect_geom)]
+    return gpd.GeoDataFrame(geometry=geoms, crs=crs)
@@ -0,0 +1,243 @@
+import glob
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from .ms_index import describe_plan, load_index, plan_tiles
+from .tile_download import DOWNLOAD_WORKERS, download_tiles
+from .tile_parser import iter_lines, parse_tile
+from .tile_store import TileStore, decode_tile
+
+# File types read by LocalFileSource (GeoParquet through GeoPandas, the rest through OGR)
+PARQUET_EXTENSIONS = (".parquet", ".geoparquet")
+DATASET_EXTENSIONS = PARQUET_EXTENSIONS + (".fgb", ".gpkg")
+
+# Registered sources by display name, in registration order
+_SOURCES = {}
+
+
+class BuildingSource:
+    """
+    Base class of building footprint sources.
+
+    Every source is used the same way: plan() lists the work items (tiles,
+    files, ...) covering an AOI, batches() fetches them and yields the
+    buildings touching the AOI bbox, one GeoDataFrame per item. Clipping to
+    the exact AOI, reprojection and writing are left to the caller.
+    """
+
+    name = None
+
+    def plan(self, aoi):
+        """
+        :param aoi: AOI polygon in EPSG:4326
+        :return: List of work items
+        """
+        raise NotImplementedError
+
+    def describe(self, plan):
+        return f"{len(plan)} items"
+
+    def batches(self, plan, aoi, workers=DOWNLOAD_WORKERS):
+        """
+        Fetches the planned items.
+
+        :return: Generator of (item, GeoDataFrame or None, error)
+        """
+        raise NotImplementedError
+
+
+class MicrosoftBuildings(BuildingSource):
+    """
+    Microsoft Global ML Building Footprints, as zoom-9 quadkey tiles.
+
+    Tiles come from the local tile store when possible; the others are
+    downloaded concurrently and stored.
+    """
+
+    name = "Microsoft Buildings"
+
+    def __init__(self, index_url=None, use_cache=True):
+        self.index_url = index_url
+        self.use_cache = use_cache
+
+    def plan(self, aoi):
+        return plan_tiles(load_index(self.index_url), aoi)
+
+    def describe(self, plan):
+        return describe_plan(plan)
+
+    @staticmethod
+    def _frame(arrays, bbox):
+        # Only buildings whose bounds touch the AOI are rebuilt
+        return gpd.GeoDataFrame(geometry=decode_tile(arrays, bbox), crs="EPSG:4326")
+
+    def batches(self, plan, aoi, workers=DOWNLOAD_WORKERS):
+        bbox = aoi.bounds
+        store = TileStore() if self.use_cache else None
+
+        # Cached tiles are read from disk, the rest is downloaded
+        missing = []
+        for tile in plan:
+            arrays = store.get(tile.quadkey, tile.url) if store is not None else None
+            if arrays is None:
+                missing.append(tile)
+                continue
+            print(f"[INFO] Serving {tile} from the tile cache")
+            yield tile, self._frame(arrays, bbox), None
+
+        # Tiles kept in the store are parsed whole, otherwise only the AOI bbox is kept
+        parse_bbox = bbox if store is None else None
+
+        def parse(tile, url, content):
+            return parse_tile(iter_lines(content), parse_bbox)
+
+        # Download + parse in parallel, yield each tile as it arrives
+        for tile, arrays, error in download_tiles(((tile, tile.url) for tile in missing), parse, workers=workers):
+            if error is not None:
+                yield tile, None, error
+                continue
+            if store is not None:
+                store.put(tile.quadkey, tile.url, arrays)
+            yield tile, self._frame(arrays, bbox), None
+
+
+def _bounds_in(aoi, crs):
+    """
+    Bounds of an EPSG:4326 AOI in another CRS.
+    """
+    return tuple(gpd.GeoSeries([aoi], crs="EPSG:4326").to_crs(crs).total_bounds)
+
+
+def _read_parquet_bbox(path, aoi):
+    """
+    Reads the geometries of a GeoParquet file within the AOI bbox.
+
+    Files with a bbox covering column (GeoParquet 1.1) let GeoPandas skip
+    row groups from the covering statistics. Other files are read one row
+    group at a time and filtered on the geometry bounds, so memory stays
+    bounded by a row group.
+    """
+    try:
+        from pyarrow import parquet
+    except ImportError:
+        raise RuntimeError("Reading GeoParquet requires the 'pyarrow' library (pip install pyarrow).")
+
+    geo = json.loads(parquet.read_schema(path).metadata[b"geo"])
+    column = geo["primary_column"]
+    meta = geo["columns"][column]
+    # GeoParquet defaults to OGC:CRS84 (lon/lat) when no crs is given
+    crs = meta.get("crs", "OGC:CRS84")
+    bbox = _bounds_in(aoi, crs)
+    if "covering" in meta:
+        return gpd.read_parquet(path, columns=[column], bbox=bbox)
+
+    if meta.get("encoding", "WKB").upper() != "WKB":
+        # Native (GeoArrow) encodings are decoded by GeoPandas
+        gdf = gpd.read_parquet(path, columns=[column])
+        return gdf[gdf.geometry.intersects(shapely.box(*bbox))]
+
+    minx, miny, maxx, maxy = bbox
+    parquet_file = parquet.ParquetFile(path)
+    parts = []
+    for i in range(parquet_file.num_row_groups):
+        wkbs = parquet_file.read_row_group(i, columns=[column]).column(column).to_numpy(zero_copy_only=False)
+        geoms = shapely.from_wkb(wkbs)
+        bounds = shapely.bounds(geoms)
+        keep = (bounds[:, 0] <= maxx) & (bounds[:, 2] >= minx) & (bounds[:, 1] <= maxy) & (bounds[:, 3] >= miny)
+        parts.append(geoms[keep])
+    geoms = np.concatenate(parts) if parts else np.empty(0, dtype=object)
+    return gpd.GeoDataFrame(geometry=geoms, crs=crs)
+
+
+def _read_ogr_bbox(path, aoi):
+    """
+    Reads the geometries of an OGR dataset (FlatGeobuf, GeoPackage, ...)
+    within the AOI bbox, using the dataset's spatial index.
+    """
+    from osgeo import ogr
+
+    source = f"/vsicurl/{path}" if path.startswith(("http://", "https://")) else path
+    dataset = ogr.Open(source)
+    if dataset is None:
+        raise RuntimeError(f"Could not open {path}")
+
+    layer = dataset.GetLayer(0)
+    srs = layer.GetSpatialRef()
+    if srs is None:
+        # Guessing (lon/lat or the map CRS) would silently select the wrong area
+        raise ValueError(f"{path} has no coordinate reference system; define one (e.g. a .prj file) to use it.")
+    crs = srs.ExportToWkt()
+
+    definition = layer.GetLayerDefn()
+    layer.SetIgnoredFields([definition.GetFieldDefn(i).GetName() for i in range(definition.GetFieldCount())])
+    layer.SetSpatialFilterRect(*_bounds_in(aoi, crs))
+
+    wkbs = []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is not None:
+            wkbs.append(bytes(geom.ExportToIsoWkb()))
+    return gpd.GeoDataFrame(geometry=shapely.from_wkb(wkbs), crs=crs)
+
+
+class LocalFileSource(BuildingSource):
+    """
+    Building footprints from local or mirrored GeoParquet / FlatGeobuf data.
+
+    path is a single file, a directory of files (e.g. a partitioned mirror)
+    or the http(s) URL of a FlatGeobuf, read with range requests through
+    GDAL's /vsicurl/. Only features in the AOI bbox are read.
+    """
+
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name or f"Local: {os.path.basename(path.rstrip('/').rstrip(os.sep))}"
+
+    def plan(self, aoi):
+        if not os.path.isdir(self.path):
+            return [self.path]
+        files = glob.glob(os.path.join(self.path, "**", "*"), recursive=True)
+        return sorted(path for path in files if path.lower().endswith(DATASET_EXTENSIONS))
+
+    def describe(self, plan):
+        size = sum(os.path.getsize(path) for path in plan if os.path.isfile(path))
+        return f"{len(plan)} files, {size / 1024 ** 2:.1f} MB"
+
+    def batches(self, plan, aoi, workers=DOWNLOAD_WORKERS):
+        for path in plan:
+            try:
+                if path.lower().endswith(PARQUET_EXTENSIONS):
+                    gdf = _read_parquet_bbox(path, aoi)
+                else:
+                    gdf = _read_ogr_bbox(path, aoi)
+            except Exception as e:
+                yield path, None, e
+                continue
+            print(f"[INFO] Read {len(gdf)} buildings from {path}")
+            yield path, gdf, None
+
+
+def register_source(source):
+    """
+    Makes a BuildingSource available under its name (replacing any previous one).
+    """
+    _SOURCES[source.name] = source
+    return source
+
+
+def get_source(name):
+    try:
+        return _SOURCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown building source '{name}'. Choose one of {source_names()}.")
+
+
+def source_names():
+    return list(_SOURCES)
+
+
+register_source(MicrosoftBuildings())
@@ -0,0 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Tiles downloaded at the same time
+DOWNLOAD_WORKERS = 4
+
+# Extra attempts per tile after a failed request
+DOWNLOAD_RETRIES = 3
+
+# (connect, read) timeout in seconds
+DOWNLOAD_TIMEOUT = (10, 120)
+
+# Delay before the first retry, doubled for every further attempt
+DOWNLOAD_BACKOFF = 1.0
+
+# Server responses worth retrying
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+def make_session(pool_size=DOWNLOAD_WORKERS):
+    """
+    Returns a requests.Session whose connection pool fits pool_size threads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _report(key, status, info=None):
+    message = f"[INFO] Tile {key}: {status}"
+    if info:
+        message += f" ({info})"
+    print(message)
+
+
+def fetch_url(session, url, retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT, backoff=DOWNLOAD_BACKOFF,
+              on_retry=None):
+    """
+    Downloads a URL, retrying connection errors, timeouts, connections
+    dropped while the body streams in and 5xx/429 answers with exponential
+    backoff.
+
+    :return: Response body as bytes
+    """
+    for attempt in range(retries + 1):
+        try:
+            with session.get(url, timeout=timeout, stream=True) as response:
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    response.raise_for_status()
+                    # Read inside the retried block, the body can still fail
+                    return response.content
+                reason = f"HTTP {response.status_code}"
+        except requests.HTTPError:
+            raise
+        except requests.RequestException as e:
+            if attempt == retries:
+                raise
+            reason = type(e).__name__
+
+        delay = backoff * 2 ** attempt
+        if on_retry is not None:
+            on_retry(attempt + 1, reason, delay)
+        time.sleep(delay)
+
+
+def download_tiles(tiles, process, workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT,
+                   backoff=DOWNLOAD_BACKOFF, session=None, on_status=_report):
+    """
+    Downloads tiles concurrently and processes each one as soon as it arrives.
+
+    process runs in the worker thread right after its download, so parsing
+    one tile overlaps with the network I/O of the others. Results are
+    yielded in completion order; a tile that still fails after all retries
+    is yielded with its error instead of a result.
+
+    :param tiles: Iterable of (key, url)
+    :param process: Callable (key, url, content) -> result
+    :param workers: Maximum number of tiles in flight
+    :param session: Optional shared requests.Session (pooled by default)
+    :param on_status: Callable (key, status, info) for per-tile progress,
+        status being "fetching", "retrying", "done" or "failed"
+    :return: Generator of (key, result, error)
+    """
+    session = session or make_session(workers)
+    on_status = on_status or (lambda *args: None)
+
+    def run(key, url):
+        on_status(key, "fetching", url)
+        content = fetch_url(
+            session, url, retries, timeout, backoff,
+            on_retry=lambda attempt, reason, delay: on_status(key, "retrying", f"{reason}, attempt {attempt} in {delay:g}s"))
+        return process(key, url, content)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, key, url): key for key, url in tiles}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                on_status(key, "failed", str(e))
+                yield key, None, e
+            else:
+                on_status(key, "done")
+                yield key, result, None
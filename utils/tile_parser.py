@@ -0,0 +1,104 @@
+import gzip
+import io
+import json
+import re
+
+import numpy as np
+import shapely
+
+from .tile_store import encode_tile
+
+# Upper bound (degrees) on the extent of a single building record. A record
+# whose first vertex is farther than this from the AOI bbox cannot touch it.
+MAX_BUILDING_SPAN = 0.05
+
+# First coordinate pair of a GeoJSON geometry, read without parsing the line
+_FIRST_POINT = re.compile(rb'"coordinates"\s*:\s*[\s\[]*(-?[0-9.eE+-]+)\s*,\s*(-?[0-9.eE+-]+)')
+
+
+def iter_lines(content):
+    """
+    Iterates over the lines of a downloaded tile, decompressing gzip on the fly.
+    """
+    stream = io.BytesIO(content)
+    if content[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def parse_tile(lines, bbox=None):
+    """
+    Parses GeoJSON feature lines into tile store arrays (see encode_tile).
+
+    With a bbox, records are first screened on their first vertex straight
+    from the raw line (see MAX_BUILDING_SPAN), and only the remaining ones
+    are decoded and checked against the bounds of their exterior rings.
+    Buildings outside the AOI are never accumulated or turned into shapely
+    objects.
+
+    :param lines: Iterable of JSON lines as bytes, e.g. iter_lines(content)
+    :param bbox: Optional (minx, miny, maxx, maxy) in EPSG:4326
+    :return: Dict of NumPy arrays
+    """
+    minx, miny, maxx, maxy = bbox if bbox is not None else (-np.inf, -np.inf, np.inf, np.inf)
+    near = (minx - MAX_BUILDING_SPAN, miny - MAX_BUILDING_SPAN, maxx + MAX_BUILDING_SPAN, maxy + MAX_BUILDING_SPAN)
+
+    points = []
+    ring_ends = []
+    part_ends = []
+    geom_ends = []
+    bounds = []
+    for line in lines:
+        if bbox is not None:
+            match = _FIRST_POINT.search(line)
+            if match is not None:
+                x, y = float(match.group(1)), float(match.group(2))
+                if x < near[0] or x > near[2] or y < near[1] or y > near[3]:
+                    continue
+
+        record = json.loads(line)
+        geometry = record.get("geometry", record)
+        if not geometry:
+            continue
+        if geometry["type"] == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+
+        xs = [point[0] for polygon in polygons for point in polygon[0]]
+        ys = [point[1] for polygon in polygons for point in polygon[0]]
+        if not xs:
+            continue
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        if x0 > maxx or x1 < minx or y0 > maxy or y1 < miny:
+            continue
+
+        for polygon in polygons:
+            for ring in polygon:
+                points.extend(ring)
+                ring_ends.append(len(points))
+            part_ends.append(len(ring_ends))
+        geom_ends.append(len(part_ends))
+        bounds.append((x0, y0, x1, y1))
+
+    if not geom_ends:
+        return encode_tile([])
+
+    arrays = {
+        "coords": np.array(points, dtype=float)[:, :2],
+        "bounds": np.array(bounds, dtype=float),
+        "offsets_0": np.array([0] + ring_ends, dtype=np.int64),
+        "offsets_1": np.array([0] + part_ends, dtype=np.int64),
+    }
+    if len(part_ends) == len(geom_ends):
+        arrays["geometry_type"] = np.array(int(shapely.GeometryType.POLYGON))
+    else:
+        # Single polygons become one-part multipolygons
+        arrays["geometry_type"] = np.array(int(shapely.GeometryType.MULTIPOLYGON))
+        arrays["offsets_2"] = np.array([0] + geom_ends, dtype=np.int64)
+    return arrays
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import shapely
+
+from .disk_cache import DiskCache, default_cache_dir, fingerprint
+
+# Default size cap of the on-disk building tile store, overridden by the
+# URBANMATRIX_TILE_CACHE_MB environment variable
+TILE_CACHE_MAX_MB = 2048
+
+# Bumped whenever the stored array layout changes
+TILE_FORMAT_VERSION = 1
+
+
+def encode_tile(geoms):
+    """
+    Packs the geometries of one tile into flat columnar arrays.
+
+    Coordinates and ring/part offsets are stored as in shapely's ragged
+    array layout, together with the bounds of every geometry.
+
+    :param geoms: Array of polygon geometries (EPSG:4326)
+    :return: Dict of NumPy arrays
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    if len(geoms) == 0:
+        return {"geometry_type": np.array(int(shapely.GeometryType.POLYGON)), "coords": np.empty((0, 2)),
+                "bounds": np.empty((0, 4)), "offsets_0": np.zeros(1, dtype=np.int64),
+                "offsets_1": np.zeros(1, dtype=np.int64)}
+
+    geometry_type, coords, offsets = shapely.to_ragged_array(geoms)
+    arrays = {"geometry_type": np.array(int(geometry_type)), "coords": coords, "bounds": shapely.bounds(geoms)}
+    for i, level in enumerate(offsets):
+        arrays[f"offsets_{i}"] = level
+    return arrays
+
+
+def _ranges(starts, ends):
+    """
+    Concatenation of arange(start, end) for every pair, as one index array.
+    """
+    lengths = ends - starts
+    if lengths.sum() == 0:
+        return np.empty(0, dtype=np.int64)
+    shift = np.cumsum(lengths) - lengths
+    return np.repeat(starts - shift, lengths) + np.arange(lengths.sum())
+
+
+def decode_tile(arrays, bbox=None):
+    """
+    Rebuilds the geometries of a tile, optionally only those touching a bbox.
+
+    The bbox test runs on the stored bounds, so rejected buildings are never
+    turned into shapely objects.
+
+    :param arrays: Dict returned by encode_tile
+    :param bbox: Optional (minx, miny, maxx, maxy) in EPSG:4326
+    :return: Array of shapely geometries
+    """
+    bounds = arrays["bounds"]
+    if bbox is None:
+        idx = np.arange(len(bounds))
+    else:
+        minx, miny, maxx, maxy = bbox
+        idx = np.flatnonzero((bounds[:, 0] <= maxx) & (bounds[:, 2] >= minx) &
+                             (bounds[:, 1] <= maxy) & (bounds[:, 3] >= miny))
+
+    # Walk the offsets from geometries down to coordinates, keeping only idx
+    levels = sorted(name for name in arrays if name.startswith("offsets_"))
+    offsets = []
+    for name in reversed(levels):
+        level = arrays[name]
+        starts, ends = level[idx], level[idx + 1]
+        offsets.append(np.concatenate([[0], np.cumsum(ends - starts)]))
+        idx = _ranges(starts, ends)
+
+    geometry_type = shapely.GeometryType(int(arrays["geometry_type"]))
+    if len(offsets[0]) == 1:
+        return np.empty(0, dtype=object)
+    return shapely.from_ragged_array(geometry_type, arrays["coords"][idx], tuple(reversed(offsets)))
+
+
+class TileStore:
+    """
+    Persistent store of downloaded building tiles, keyed by QuadKey and URL.
+
+    Tiles are kept as compressed columnar arrays (see encode_tile) in a
+    DiskCache, which provides the size cap, LRU eviction and checksums.
+    """
+
+    def __init__(self, directory=None, max_mb=None):
+        if max_mb is None:
+            max_mb = int(os.environ.get("URBANMATRIX_TILE_CACHE_MB", TILE_CACHE_MAX_MB))
+        self.cache = DiskCache(directory or default_cache_dir("tiles"), max_mb * 1024 * 1024, compress=True)
+
+    @staticmethod
+    def key(quadkey, url):
+        return fingerprint("tile", TILE_FORMAT_VERSION, quadkey, url)
+
+    def __contains__(self, tile):
+        return self.key(*tile) in self.cache
+
+    def get(self, quadkey, url):
+        """
+        Returns the stored arrays of a tile, or None if it is not cached.
+        """
+        return self.cache.get(self.key(quadkey, url))
+
+    def put(self, quadkey, url, arrays):
+        self.cache.put(self.key(quadkey, url), arrays)
+
+    def clear(self):
+        self.cache.clear()